@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Command-line runner solving batches of TSP and Mastermind instances
+
+Every (instance, seed) pair is one run. The runs are spread over worker
+processes and written as JSON lines (to stdout or --output) as soon as
+they end, so the output is in completion order.
+
+    python -m batch_run tsp cities.txt big.txt --num-cities 200 --seeds 0 1 2 --workers 4
+    python -m batch_run mastermind 4 8 12 --pop-size 200 --output runs.jsonl
+
+The solver modules are only imported by the processes running the solves,
+and each record gives the cold start of its process: the time spent
+importing them before its first run (0 for the next runs).
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+import time
+
+# Seconds spent importing the solver modules in this process (see _warm_up)
+_cold_start = None
+
+
+def _warm_up():
+    """Imports the solver modules the first time it is called in a process
+
+    Returns:
+        float: the import time, on the first call only (0.0 afterwards)
+    """
+    global _cold_start
+    if _cold_start is not None:
+        return 0.0
+    start = time.perf_counter()
+    import cities, ga_control, ga_solver, mastermind_problem, tsp_problem  # noqa: F401
+    _cold_start = time.perf_counter() - start
+    return _cold_start
+
+
+def run_instance(kind, instance, seed, options):
+    """Solves one instance with one seed
+
+    Args:
+        kind (str): 'tsp' or 'mastermind'
+        instance (str): city file (TSP) or secret size (Mastermind)
+        seed (int): seed of the problem and solver random streams
+        options (dict): solver settings (see main)
+
+    Returns:
+        dict: the record of the run
+    """
+    cold_start = _warm_up()
+    import cities
+    from ga_control import NoImprovement, SolutionFound, WallClock
+    from ga_solver import GASolver, RandomStream
+    from mastermind_problem import MastermindProblem
+    from tsp_problem import TSProblem
+
+    start = time.perf_counter()
+    problem_rng, solver_rng = RandomStream(seed).spawn(2)
+    if kind == 'tsp':
+        problem = TSProblem(cities.load_city_arrays(instance), num_cities=options['num_cities'],
+                            greedy_fraction=options['greedy_fraction'], rng=problem_rng)
+        size = problem.num_cities
+    else:
+        size = int(instance)
+        problem = MastermindProblem(secret_size=size, rng=problem_rng)
+    stopping = [SolutionFound()]
+    if options['patience']:
+        stopping.append(NoImprovement(options['patience']))
+    if options['time_limit']:
+        stopping.append(WallClock(options['time_limit']))
+
+    with GASolver(problem, selection_rate=options['selection_rate'],
+                  mutation_rate=options['mutation_rate'], pop_size=options['pop_size'],
+                  deduplicate=options['deduplicate'], rng=solver_rng) as solver:
+        solver.reset_population()
+        # the solver still prints some stops (threshold, empty population):
+        # keep stdout for the records
+        with contextlib.redirect_stdout(sys.stderr):
+            reason = solver.evolve_until(options['generations'], stopping=stopping)
+        best = solver.get_best_individual()
+        record = {
+            'problem': kind,
+            'instance': instance,
+            'size': size,
+            'seed': seed,
+            'pop_size': options['pop_size'],
+            'selection_rate': options['selection_rate'],
+            'mutation_rate': options['mutation_rate'],
+            'generations': solver.get_generation(),
+            'evaluations': solver.get_evaluation_count(),
+            'stop_reason': reason,
+            'best_fitness': best.fitness,
+            'solved': bool(problem.is_solution_found(best, solver.get_generation())),
+            'elapsed': time.perf_counter() - start,
+            'worker': os.getpid(),
+            'cold_start': cold_start,
+        }
+    if options['solutions']:
+        record['solution'] = problem.decode(best.chromosome) if kind == 'tsp' else best.chromosome
+    return record
+
+
+def run_batch(kind, runs, options, workers=None):
+    """Solves (instance, seed) pairs, in worker processes if workers > 1
+
+    Yields:
+        dict: the record of each run, as soon as it ends
+    """
+    if workers is None or workers <= 1:
+        for instance, seed in runs:
+            yield run_instance(kind, instance, seed, options)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(run_instance, kind, instance, seed, options)
+                   for instance, seed in runs]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # a generator closed early drops the runs not started yet
+        executor.shutdown(cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve batches of TSP or Mastermind instances "
+                                                 "and write one JSON line per run")
+    parser.add_argument('problem', choices=['tsp', 'mastermind'])
+    parser.add_argument('instances', nargs='+',
+                        help="city files (tsp) or secret sizes (mastermind)")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0])
+    parser.add_argument('--pop-size', type=int, default=50)
+    parser.add_argument('--selection-rate', type=float, default=0.5)
+    parser.add_argument('--mutation-rate', type=float, default=0.1)
+    parser.add_argument('--generations', type=int, default=500,
+                        help="maximum number of generations")
+    parser.add_argument('--patience', type=int,
+                        help="stop after this many generations without improvement")
+    parser.add_argument('--time-limit', type=float, help="seconds allowed to each run")
+    parser.add_argument('--deduplicate', choices=['reject', 'replace'])
+    parser.add_argument('--num-cities', type=int,
+                        help="cities visited (the first ones of the file; all by default)")
+    parser.add_argument('--greedy-fraction', type=float, default=0.0,
+                        help="fraction of the initial roads built by nearest neighbour")
+    parser.add_argument('--workers', type=int, default=1, help="runs solved in parallel")
+    parser.add_argument('--solutions', action='store_true',
+                        help="add the best road or guess to the records")
+    parser.add_argument('--output', help="JSON lines file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    options = {name: getattr(args, name) for name in (
+        'pop_size', 'selection_rate', 'mutation_rate', 'generations', 'patience',
+        'time_limit', 'deduplicate', 'num_cities', 'greedy_fraction', 'solutions')}
+    runs = list(itertools.product(args.instances, args.seeds))
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for record in run_batch(args.problem, runs, options, args.workers):
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+# -*- coding: utf-8 -*-
+"""
+Batch solving of many small TSP and Mastermind instances
+
+The instances of a batch share read-only structures computed once by the
+calling process and placed in shared memory, so that the worker processes
+neither recompute nor receive a copy of them:
+- TSP instances visiting the first num_cities cities of one city table
+  share the names, the coordinates and the distance matrix of the largest
+  instance (each one uses the top-left block of the matrix);
+- Mastermind matches of one secret size share the candidate space and the
+  feedback table of the exhaustive solver (see mastermind_solver); secrets
+  too large for it are solved by the genetic algorithm.
+
+The instances are sent to the workers in small chunks, largest first, so
+that the workers done early keep taking the remaining ones, and the record
+of each instance is yielded as soon as it is solved:
+
+    table = cities.load_city_arrays('cities.txt')
+    instances = [(num_cities, seed) for num_cities in (20, 50) for seed in range(1000)]
+    for record in solve_tsp_instances(table, instances, n_workers=8):
+        print(record['index'], record['best_fitness'])
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import contextlib
+import os
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import cities
+from ga_control import NoImprovement, SolutionFound, WallClock
+from ga_solver import GASolver, RandomStream
+from mastermind_problem import MastermindProblem
+import mastermind as mm
+import mastermind_solver
+from tsp_problem import TSProblem
+
+
+class SharedArray:
+    """NumPy array held in a shared memory block
+
+    Pickling a SharedArray (to send it to a worker process) only sends the
+    name of its block, which the receiving process maps again: the data is
+    never copied. The array is read-only; the process that created it frees
+    the block with unlink once the workers are done.
+    """
+
+    def __init__(self, array):
+        """Copies an array into a new shared memory block"""
+        array = np.ascontiguousarray(array)
+        self._memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self._owner = True
+        self.array = np.ndarray(array.shape, array.dtype, buffer=self._memory.buf)
+        self.array[...] = array
+        self.array.flags.writeable = False
+
+    def __getstate__(self):
+        return self._memory.name, self.array.shape, self.array.dtype.str
+
+    def __setstate__(self, state):
+        name, shape, dtype = state
+        self._memory = shared_memory.SharedMemory(name=name)
+        self._owner = False
+        self.array = np.ndarray(shape, dtype, buffer=self._memory.buf)
+        self.array.flags.writeable = False
+
+    def unlink(self):
+        """Frees the block (no view of the array may be used afterwards)"""
+        self.array = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+class SharedCities:
+    """Names, coordinates and distance matrix of the first cities of a city
+    table, shared by TSP instances visiting the first num_cities of them"""
+
+    def __init__(self, city_dict, max_cities=None, dense_distance_limit=5000):
+        """Computes the shared structures
+
+        Args:
+            city_dict (dict): cities with their coordinates, or
+                cities.CityTable (see cities.load_city_arrays)
+            max_cities (int, optional): largest num_cities of the instances.
+                Defaults to None (every city).
+            dense_distance_limit (int, optional): above this number of
+                cities, no distance matrix is shared (see TSProblem).
+                Defaults to 5000.
+        """
+        if max_cities is None or max_cities > len(city_dict):
+            max_cities = len(city_dict)
+        if isinstance(city_dict, cities.CityTable):
+            names = city_dict.names[:max_cities]
+            coordinates = np.asarray(city_dict.coordinates[:max_cities], dtype=float)
+        else:
+            names = np.array(cities.default_road(city_dict)[:max_cities])
+            coordinates = np.array([city_dict[c] for c in names.tolist()],
+                                   dtype=float).reshape(-1, 2)
+        self.max_cities = max_cities
+        self.names = SharedArray(names)
+        self.coordinates = SharedArray(coordinates)
+        self.distances = None
+        if max_cities <= dense_distance_limit:
+            self.distances = SharedArray(cities.distance_matrix(coordinates))
+
+    def problem(self, num_cities, rng=None, **problem_options):
+        """TSProblem visiting the first num_cities cities, built on the shared
+        structures (other arguments as TSProblem)"""
+        if num_cities > self.max_cities:
+            raise ValueError(f"Only {self.max_cities} cities are shared")
+        table = cities.CityTable(self.names.array, self.coordinates.array)
+        distances = None if self.distances is None else self.distances.array
+        return TSProblem(table, num_cities=num_cities, distances=distances, rng=rng,
+                         **problem_options)
+
+    def solve(self, num_cities, seed, settings):
+        """Solves the instance visiting the first num_cities cities with the
+        genetic algorithm
+
+        Returns:
+            dict: the record of the instance (see _evolve)
+        """
+        problem_rng, solver_rng = RandomStream(seed).spawn(2)
+        problem = self.problem(num_cities, problem_rng, **settings['problem_options'])
+        record, best = _evolve(problem, solver_rng, settings)
+        if settings['solutions']:
+            record['solution'] = problem.decode(best.chromosome)
+        return record
+
+    def unlink(self):
+        """Frees the shared memory"""
+        for shared in (self.names, self.coordinates, self.distances):
+            if shared is not None:
+                shared.unlink()
+
+
+class SharedCandidateSpaces:
+    """Candidate spaces and feedback tables of the exhaustive Mastermind
+    solver, shared by matches of the same secret sizes"""
+
+    def __init__(self, secret_sizes, max_space_size=6**6, table_size_limit=1296):
+        """Computes the shared structures
+
+        Args:
+            secret_sizes (iterable[int]): secret sizes of the matches; those
+                whose candidate space exceeds max_space_size are solved by
+                the genetic algorithm and need nothing shared
+            max_space_size (int, optional): largest candidate space solved
+                exhaustively. Defaults to 6^6 (as mastermind_solver.solve).
+            table_size_limit (int, optional): largest candidate space whose
+                feedback table is computed (see ConsistentSetSolver).
+                Defaults to 1296.
+        """
+        nb_colors = len(mm.get_possible_colors())
+        # point schedule of the matches of MastermindProblem
+        self.points = (1, 3)
+        self.table_size_limit = table_size_limit
+        self._arrays = {}
+        for size in sorted(set(secret_sizes)):
+            if nb_colors ** size > max_space_size:
+                continue
+            space = mastermind_solver.CandidateSpace(size)
+            table = None
+            if len(space) <= table_size_limit:
+                scores = space.feedback_table(*self.points)
+                # scores are small integers: 2 bytes each instead of 8 (uint8
+                # would be smaller, but np.unique counts it twice as slowly)
+                table = SharedArray(scores.astype(np.int16))
+            self._arrays[size] = (SharedArray(space.codes), SharedArray(space.color_sets), table)
+        # CandidateSpace objects over the shared arrays, per process
+        self._spaces = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_spaces'] = {}
+        return state
+
+    def space(self, secret_size):
+        """CandidateSpace of a secret size over the shared arrays, or None if
+        the matches of this size are solved by the genetic algorithm"""
+        if secret_size not in self._arrays:
+            return None
+        if secret_size not in self._spaces:
+            codes, color_sets, table = self._arrays[secret_size]
+            self._spaces[secret_size] = mastermind_solver.CandidateSpace.from_arrays(
+                codes.array, color_sets.array,
+                None if table is None else table.array, self.points)
+        return self._spaces[secret_size]
+
+    def solve(self, secret_size, seed, settings):
+        """Solves a match with a random secret, exhaustively if its candidate
+        space is shared, with the genetic algorithm otherwise
+
+        Returns:
+            dict: the record of the match (see _evolve); exhaustive solves
+            give the number of guesses played as evaluations and have no
+            generations
+        """
+        problem_rng, solver_rng = RandomStream(seed).spawn(2)
+        problem = MastermindProblem(secret_size, rng=problem_rng)
+        space = self.space(secret_size)
+        if space is None:
+            record, best = _evolve(problem, solver_rng, settings)
+            record['method'] = 'genetic'
+            solution = best.chromosome
+        else:
+            start = time.perf_counter()
+            solver = mastermind_solver.ConsistentSetSolver(
+                secret_size, table_size_limit=self.table_size_limit, rng=solver_rng,
+                space=space)
+            history = solver.play(problem.match)
+            solution, score = history[-1]
+            record = {
+                'size': secret_size,
+                'method': 'exhaustive',
+                'evaluations': len(history),
+                'best_fitness': int(score),
+                'solved': problem.match.is_correct(solution),
+                'elapsed': time.perf_counter() - start,
+            }
+        if settings['solutions']:
+            record['solution'] = solution
+        return record
+
+    def unlink(self):
+        """Frees the shared memory"""
+        self._spaces = {}
+        for arrays in self._arrays.values():
+            for shared in arrays:
+                if shared is not None:
+                    shared.unlink()
+
+
+def _evolve(problem, solver_rng, settings):
+    """Runs the genetic algorithm on one instance
+
+    Returns:
+        tuple: the record of the run (size, generations, evaluations,
+        stop_reason, best_fitness, solved, elapsed) and the best individual
+    """
+    start = time.perf_counter()
+    stopping = [SolutionFound()]
+    if settings['patience']:
+        stopping.append(NoImprovement(settings['patience']))
+    if settings['time_limit']:
+        stopping.append(WallClock(settings['time_limit']))
+    with GASolver(problem, rng=solver_rng, **settings['solver_options']) as solver:
+        solver.reset_population()
+        # the solver still prints some stops (threshold, empty population):
+        # a batch of thousands of instances must not flood the caller's stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            reason = solver.evolve_until(settings['generations'], stopping=stopping)
+        best = solver.get_best_individual()
+        record = {
+            'size': len(best.chromosome),
+            'generations': solver.get_generation(),
+            'evaluations': solver.get_evaluation_count(),
+            'stop_reason': reason,
+            'best_fitness': best.fitness,
+            'solved': bool(problem.is_solution_found(best, solver.get_generation())),
+            'elapsed': time.perf_counter() - start,
+        }
+    return record, best
+
+
+# Shared structures and settings of the batch of this process (see _init_worker)
+_batch = None
+# Seconds from the start of the batch to this process being ready to solve,
+# reported by the first instance solved here
+_cold_start = None
+
+
+def _init_worker(shared, settings, started):
+    """Initializer of the worker processes: receives the shared structures
+    (mapping their memory) and the settings once
+
+    Args:
+        started (float): time.time() when the batch created its pool; the
+            cold start of the worker counts from there, so that it includes
+            the start of the process, its imports and the unpickling of
+            shared (done before this function is called)
+    """
+    global _batch, _cold_start
+    _batch = (shared, settings)
+    _cold_start = time.time() - started
+
+
+def _solve_chunk(kind, tasks):
+    """Solves (index, size, seed) instances of the batch of this process
+
+    Returns:
+        list[dict]: their records
+    """
+    global _cold_start
+    shared, settings = _batch
+    records = []
+    for index, size, seed in tasks:
+        record = {'problem': kind, 'index': index, 'seed': seed}
+        record.update(shared.solve(size, seed, settings))
+        record['worker'] = os.getpid()
+        record['cold_start'], _cold_start = _cold_start or 0.0, 0.0
+        records.append(record)
+    return records
+
+
+def _run_batch(kind, shared, instances, settings, n_workers, chunk_size):
+    """Solves the (size, seed) instances on the shared structures and yields
+    their records as they are solved; the shared memory is freed when the
+    generator ends or is closed (closing it cancels the instances not
+    started yet, and waits for those being solved)"""
+    global _batch
+    tasks = [(index, size, seed) for index, (size, seed) in enumerate(instances)]
+    # largest first, so that the small ones fill the gaps at the end
+    tasks.sort(key=lambda task: task[1], reverse=True)
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    try:
+        if n_workers == 1:
+            _init_worker(shared, settings, time.time())
+            for chunk in chunks:
+                yield from _solve_chunk(kind, chunk)
+            return
+        executor = ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                       initargs=(shared, settings, time.time()))
+        try:
+            futures = [executor.submit(_solve_chunk, kind, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                yield from future.result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+    finally:
+        _batch = None
+        shared.unlink()
+
+
+def _settings(generations, patience, time_limit, solutions, problem_options, solver_options):
+    return {'generations': generations, 'patience': patience, 'time_limit': time_limit,
+            'solutions': solutions, 'problem_options': problem_options or {},
+            'solver_options': solver_options}
+
+
+def solve_tsp_instances(city_dict, instances, n_workers=None, chunk_size=1,
+                        generations=500, patience=None, time_limit=None, solutions=False,
+                        problem_options=None, dense_distance_limit=5000, **solver_options):
+    """Solves TSP instances over the same cities with the genetic algorithm
+
+    Args:
+        city_dict (dict): cities with their coordinates, or cities.CityTable
+        instances (iterable[tuple]): (num_cities, seed) of each instance: it
+            visits the first num_cities cities, drawing from RandomStream(seed)
+        n_workers (int, optional): Number of worker processes. Defaults to
+            None (one per processor); 1 solves in this process.
+        chunk_size (int, optional): Number of instances per task sent to a
+            worker. Defaults to 1.
+        generations (int, optional): Maximum number of generations per
+            instance. Defaults to 500.
+        patience (int, optional): Stop an instance after this many
+            generations without improvement. Defaults to None.
+        time_limit (float, optional): Seconds allowed to each instance.
+            Defaults to None.
+        solutions (bool, optional): Add the best road (city names) to the
+            records. Defaults to False.
+        problem_options (dict, optional): Other arguments of TSProblem.
+        dense_distance_limit (int, optional): see SharedCities.
+        solver_options: Arguments of GASolver (pop_size, rates...)
+
+    Yields:
+        dict: the record of each instance as soon as it is solved: problem,
+        index (position in instances), seed, size, generations, evaluations,
+        stop_reason, best_fitness, solved, elapsed, worker (process id),
+        cold_start (seconds from the creation of the pool to the worker
+        being ready: process start, imports, mapping of the shared memory;
+        on the first record of each worker only, 0.0 on the others).
+        The shared structures are computed when the iteration starts and
+        freed when it ends (or when the generator is closed).
+    """
+    instances = list(instances)
+    shared = SharedCities(city_dict, max((size for size, _ in instances), default=0),
+                          dense_distance_limit)
+    settings = _settings(generations, patience, time_limit, solutions, problem_options,
+                         solver_options)
+    yield from _run_batch('tsp', shared, instances, settings, n_workers, chunk_size)
+
+
+def solve_mastermind_instances(instances, n_workers=None, chunk_size=1, max_space_size=6**6,
+                               table_size_limit=1296, generations=500, patience=None,
+                               time_limit=None, solutions=False, **solver_options):
+    """Solves Mastermind matches, exhaustively when their candidate space is
+    small enough (see mastermind_solver.solve), with the genetic algorithm
+    otherwise
+
+    Args:
+        instances (iterable[tuple]): (secret_size, seed) of each match: its
+            secret and guesses are drawn from RandomStream(seed)
+        max_space_size, table_size_limit (int, optional): see
+            SharedCandidateSpaces
+        other arguments: as solve_tsp_instances (solver_options are the
+            arguments of GASolver for the genetic solves)
+
+    Yields:
+        dict: the record of each match as soon as it is solved (as
+        solve_tsp_instances, with the method used: 'exhaustive' or 'genetic')
+    """
+    instances = list(instances)
+    shared = SharedCandidateSpaces((size for size, _ in instances), max_space_size,
+                                   table_size_limit)
+    settings = _settings(generations, patience, time_limit, solutions, None, solver_options)
+    yield from _run_batch('mastermind', shared, instances, settings, n_workers, chunk_size)
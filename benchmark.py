@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the genetic algorithm solver
+
+Runs GASolver on TSProblem (synthetic city sets of several sizes) and
+MastermindProblem (several secret sizes) for every combination of the
+swept parameters and several seeds, and writes one record per run with its
+throughput and convergence curve.
+
+    python -m benchmark --pop-sizes 50 200 --tour-lengths 50 200 \\
+        --secret-sizes 4 8 --seeds 0 1 2 --json results.json --csv results.csv
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import cities
+from ga_solver import GASolver
+from mastermind_problem import MastermindProblem
+from tsp_problem import TSProblem
+
+# Columns of the CSV summary (the JSON records also hold the curves)
+SUMMARY_FIELDS = ['problem', 'size', 'pop_size', 'selection_rate', 'mutation_rate',
+                  'seed', 'generations', 'elapsed', 'generations_per_second',
+                  'evaluations', 'evaluations_per_second', 'best_fitness', 'target_fitness',
+                  'time_to_target', 'generations_to_target']
+
+
+def make_city_files(tour_lengths, directory, seed=0):
+    """Writes one synthetic city file per tour length (cities.txt format)
+
+    Returns:
+        dict: the file name of each tour length
+    """
+    rng = random.Random(seed)
+    filenames = {}
+    for nb_cities in tour_lengths:
+        filenames[nb_cities] = os.path.join(directory, f"cities_{nb_cities}.txt")
+        cities.save_cities(cities.generate_cities(nb_cities, rng=rng), filenames[nb_cities])
+    return filenames
+
+
+def run_once(problem, pop_size, selection_rate, mutation_rate, generations,
+             target_fitness=None):
+    """Runs one GASolver and measures it
+
+    Args:
+        problem (GAProblem): problem to solve
+        pop_size (int): population size
+        selection_rate (float): selection rate
+        mutation_rate (float): mutation rate
+        generations (int): number of generations to run
+        target_fitness (float, optional): fitness to reach; the run stops
+            there. If None, the run has no target (time_to_target and
+            generations_to_target are None)
+
+    Returns:
+        dict: measures of the run, with its convergence curve (elapsed
+        time and best fitness after each generation)
+    """
+    solver = GASolver(problem, selection_rate=selection_rate,
+                      mutation_rate=mutation_rate, pop_size=pop_size)
+    start = time.perf_counter()
+    solver.reset_population()
+    curve = [(time.perf_counter() - start, solver.get_best_individual().fitness)]
+    for _ in range(generations):
+        solver.evolve_for_one_generation()
+        curve.append((time.perf_counter() - start, solver.get_best_individual().fitness))
+        if target_fitness is not None and curve[-1][1] >= target_fitness:
+            break
+    elapsed = time.perf_counter() - start
+    # fitness values actually computed (cache hits and duplicates included)
+    nb_evaluations = solver.get_evaluation_count()
+    solver.close()
+
+    nb_generations = len(curve) - 1
+    reached = [] if target_fitness is None else \
+        [i for i, (_, fitness) in enumerate(curve) if fitness >= target_fitness]
+    return {
+        'generations': nb_generations,
+        'elapsed': elapsed,
+        'generations_per_second': nb_generations / elapsed if elapsed else None,
+        'evaluations': nb_evaluations,
+        'evaluations_per_second': nb_evaluations / elapsed if elapsed else None,
+        'best_fitness': curve[-1][1],
+        'target_fitness': target_fitness,
+        'time_to_target': curve[reached[0]][0] if reached else None,
+        'generations_to_target': reached[0] if reached else None,
+        'curve': curve,
+    }
+
+
+def tsp_target(problem, factor):
+    """Target fitness of a TSP run: a road at most factor times as long as
+    the nearest neighbour road from the first city"""
+    greedy = problem.spatial_index.greedy_road(0)
+    return -factor * problem.road_length(greedy)
+
+
+def run_suite(pop_sizes, selection_rates, mutation_rates, tour_lengths,
+              secret_sizes, seeds, generations, directory, tsp_target_factor=1.1):
+    """Runs every combination of the parameters for every seed
+
+    TSP runs aim at tsp_target(problem, tsp_target_factor), Mastermind runs
+    at the secret.
+
+    Yields:
+        dict: the record of each run
+    """
+    city_files = make_city_files(tour_lengths, directory)
+    instances = [('tsp', n) for n in tour_lengths] + [('mastermind', n) for n in secret_sizes]
+    for (kind, size), pop_size, selection_rate, mutation_rate, seed in itertools.product(
+            instances, pop_sizes, selection_rates, mutation_rates, seeds):
+        random.seed(seed)
+        if kind == 'tsp':
+            problem = TSProblem(cities.load_cities(city_files[size]), num_cities=None)
+            target_fitness = tsp_target(problem, tsp_target_factor)
+        else:
+            problem = MastermindProblem(secret_size=size)
+            target_fitness = problem.target_fitness
+        record = {'problem': kind, 'size': size, 'pop_size': pop_size,
+                  'selection_rate': selection_rate, 'mutation_rate': mutation_rate,
+                  'seed': seed}
+        record.update(run_once(problem, pop_size, selection_rate, mutation_rate,
+                               generations, target_fitness))
+        yield record
+
+
+def write_json(records, filename):
+    """Writes the records (with their curves) as a JSON list"""
+    with open(filename, 'w') as file:
+        json.dump(records, file)
+
+
+def write_csv(records, filename):
+    """Writes one summary line per record"""
+    with open(filename, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark GASolver on the bundled problems")
+    parser.add_argument('--pop-sizes', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--selection-rates', type=float, nargs='+', default=[0.5])
+    parser.add_argument('--mutation-rates', type=float, nargs='+', default=[0.1])
+    parser.add_argument('--tour-lengths', type=int, nargs='*', default=[50, 200])
+    parser.add_argument('--secret-sizes', type=int, nargs='*', default=[4, 8])
+    parser.add_argument('--seeds', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--generations', type=int, default=100)
+    parser.add_argument('--tsp-target', type=float, default=1.1,
+                        help="TSP target: this factor times the length of the "
+                             "nearest neighbour road")
+    parser.add_argument('--json', help="file receiving the records and curves")
+    parser.add_argument('--csv', help="file receiving one summary line per run")
+    args = parser.parse_args(argv)
+
+    records = []
+    with tempfile.TemporaryDirectory() as directory:
+        for record in run_suite(args.pop_sizes, args.selection_rates, args.mutation_rates,
+                                args.tour_lengths, args.secret_sizes, args.seeds,
+                                args.generations, directory, args.tsp_target):
+            records.append(record)
+            print(f"{record['problem']:>10} size={record['size']:<5} pop={record['pop_size']:<6}"
+                  f" seed={record['seed']:<3} {record['generations_per_second']:10.1f} gen/s"
+                  f" {record['evaluations_per_second']:12.1f} eval/s"
+                  f" best={record['best_fitness']:.1f}", file=sys.stderr)
+    if args.json:
+        write_json(records, args.json)
+    if args.csv:
+        write_csv(records, args.csv)
+    return records
+
+
+if __name__ == '__main__':
+    main()
@@ -10,10 +10,16 @@ This module is accompanied of a cities.txt file, containing a list of
 2D coordinates representing different cities.
 """
 
-import matplotlib.pyplot as plt
+import numpy as np
+import io
+import os
+import random
+from itertools import islice
+from math import hypot, inf
 from random import shuffle
 from typing import List, Dict, Tuple, Optional
 from collections.abc import Iterable, Mapping
+from heapq import heappop, heappush
 
 Coordinates = Tuple[int, int]
 
@@ -28,6 +34,99 @@ def load_cities(filename) -> Dict[str,Coordinates]:
         return cities
 
 
+def save_cities(cities:Dict[str, Coordinates], filename):
+    """ save a cities list to a text file readable by load_cities """
+    with open(filename, "w") as file:
+        file.write(f"{len(cities)}\n")
+        for city_name, (x, y) in cities.items():
+            file.write(f"{city_name};{x};{y}\n")
+
+
+class CityTable(Mapping):
+    """ Cities held as a NumPy name table and an (n, 2) coordinate array
+
+    Behaves as the dict returned by load_cities (names in file order,
+    table[name] gives the coordinates) without one Python tuple per city;
+    TSProblem uses the arrays directly.
+    """
+
+    def __init__(self, names, coordinates):
+        self.names = np.asarray(names)
+        self.coordinates = coordinates
+        self._index = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names.tolist())
+
+    def __getitem__(self, name):
+        if self._index is None:
+            self._index = {c: i for i, c in enumerate(self.names.tolist())}
+        return tuple(self.coordinates[self._index[name]].tolist())
+
+
+def _parse_text(text:str, nb_cities:int) -> CityTable:
+    """ Parses the first nb_cities "name;x;y" lines of a text in bulk """
+    names = np.array(text.replace("\n", ";").split(";", 3 * nb_cities)[0:3 * nb_cities:3])
+    coordinates = np.loadtxt(io.StringIO(text), delimiter=";", usecols=(1, 2),
+                             max_rows=nb_cities, comments=None, ndmin=2)
+    if np.array_equal(coordinates, np.round(coordinates)):
+        coordinates = coordinates.astype(np.int64)
+    return CityTable(names, coordinates)
+
+
+def _cache_files(cache:str) -> Tuple[str, str]:
+    return f"{cache}.names.npy", f"{cache}.coordinates.npy"
+
+
+def load_city_arrays(filename, cache:Optional[str]=None) -> CityTable:
+    """ Load a city file (load_cities format) as a CityTable
+
+    Args:
+        filename: the city file
+        cache (str, optional): prefix of a binary cache of the parsed
+            arrays (cache.names.npy and cache.coordinates.npy). It is
+            written at the first call and memory-mapped afterwards, as long
+            as it is newer than the city file. Defaults to None (no cache).
+    """
+    if cache is not None:
+        names_file, coordinates_file = _cache_files(cache)
+        if all(os.path.exists(f) and os.path.getmtime(f) >= os.path.getmtime(filename)
+               for f in (names_file, coordinates_file)):
+            return CityTable(np.load(names_file, mmap_mode="r"),
+                             np.load(coordinates_file, mmap_mode="r"))
+    with open(filename) as file:
+        nb_cities = int(file.readline())
+        table = _parse_text(file.read(), nb_cities)
+    if cache is not None:
+        np.save(names_file, table.names)
+        np.save(coordinates_file, table.coordinates)
+    return table
+
+
+def iter_city_chunks(filename, chunk_size:int=1_000_000) -> Iterable[CityTable]:
+    """ Read a city file (load_cities format) by chunks of chunk_size
+    cities, for files too large to be held in memory at once """
+    with open(filename) as file:
+        nb_cities = int(file.readline())
+        while nb_cities > 0:
+            table = _parse_text("".join(islice(file, min(chunk_size, nb_cities))),
+                                min(chunk_size, nb_cities))
+            if not len(table):
+                break
+            nb_cities -= len(table)
+            yield table
+
+
+def generate_cities(nb_cities:int, size:int=1000, rng=random) -> Dict[str, Coordinates]:
+    """ random cities with integer coordinates between 0 and size, drawn
+    from rng (a random.Random instance or the random module) """
+    return {f"City {i}": (rng.randint(0, size), rng.randint(0, size))
+            for i in range(nb_cities)}
+
+
 def default_road(cities:Dict) -> List:
     """ Default road: all the cities in the order of the text file """
     return list(cities.keys())
@@ -35,6 +134,9 @@ def default_road(cities:Dict) -> List:
 
 def draw_cities(cities:Dict, road=Optional[Iterable[str]]):
     """ Plot the cities and the trajectory """
+    # imported here: matplotlib takes longer to load than everything else,
+    # and headless runs never plot
+    import matplotlib.pyplot as plt
     x_cords, y_coords = tuple(zip(*cities.values()))
     plt.figure()
     plt.scatter(x_cords, y_coords, color="red")
@@ -67,6 +169,318 @@ def road_length(cities:Dict[str, Coordinates], road:Iterable[str]) -> float:
     return total
 
 
+def distance_matrix(cities:Dict[str, Coordinates],
+                    names:Optional[Iterable[str]]=None) -> np.ndarray:
+    """ Dense matrix of the euclidian distances between cities
+
+    Row and column i correspond to the i-th name of `names` (all the cities
+    in the order of the text file by default). `cities` may also be an
+    (n, 2) coordinate array, whose rows are then used in order.
+    """
+    if isinstance(cities, Mapping):
+        if names is None:
+            names = default_road(cities)
+        coords = np.array([cities[c] for c in names], dtype=float).reshape(-1, 2)
+    else:
+        coords = np.asarray(cities, dtype=float).reshape(-1, 2)
+    dx = coords[:, 0, None] - coords[None, :, 0]
+    dy = coords[:, 1, None] - coords[None, :, 1]
+    return np.hypot(dx, dy)
+
+
+def indexed_road_length(distances:np.ndarray, road:Iterable[int]) -> float:
+    """ Calculate the length of a road given as city indices into a
+    distance matrix (see distance_matrix) """
+    road = np.asarray(road)
+    return float(distances[road, np.roll(road, -1)].sum())
+
+
+class CoordinateDistances:
+    """ Distances computed on demand from the coordinates, usable in place
+    of a distance matrix when it would not fit in memory:
+    distances[i, j] works with city indices or arrays of indices """
+
+    def __init__(self, coordinates):
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        self._x = self.coordinates[:, 0].tolist()
+        self._y = self.coordinates[:, 1].tolist()
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def __getitem__(self, key):
+        i, j = key
+        if type(i) is int and type(j) is int:
+            return hypot(self._x[i] - self._x[j], self._y[i] - self._y[j])
+        a, b = self.coordinates[i], self.coordinates[j]
+        return np.hypot(a[..., 0] - b[..., 0], a[..., 1] - b[..., 1])
+
+
+class SpatialIndex:
+    """ k-d tree over 2D coordinates answering nearest neighbour and radius
+    queries without comparing all the pairs of cities
+
+    Every node splits its cities in two halves at the median of its widest
+    side, down to leaves of at most leaf_size cities, so the depth stays
+    logarithmic whatever the layout (clusters, lines, duplicate cities).
+    """
+
+    def __init__(self, coordinates, leaf_size=8):
+        """ Builds the tree
+
+        Args:
+            coordinates (numpy.ndarray): one (x, y) row per city
+            leaf_size (int, optional): maximum number of cities in a leaf.
+            Defaults to 8.
+        """
+        self.coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+        n = len(self.coordinates)
+        # cities sorted by leaf: node i holds self._order[start[i]:end[i]]
+        order = np.arange(n)
+        starts, ends, parents = ([0], [n], [-1]) if n else ([], [], [])
+        lefts, rights, boxes = [], [], []
+        node = -1
+        while node + 1 < len(starts):
+            node += 1
+            start, end = starts[node], ends[node]
+            members = order[start:end]
+            points = self.coordinates[members]
+            low, high = points.min(axis=0), points.max(axis=0)
+            boxes.append((low, high))
+            if end - start <= leaf_size:
+                lefts.append(-1)
+                rights.append(-1)
+                continue
+            axis = int(np.argmax(high - low))
+            middle = (start + end) // 2
+            order[start:end] = members[np.argpartition(points[:, axis], middle - start)]
+            lefts.append(len(starts))
+            rights.append(len(starts) + 1)
+            starts += [start, middle]
+            ends += [middle, end]
+            parents += [node, node]
+        self._order = order
+        self._starts, self._ends, self._parents = starts, ends, parents
+        self._lefts, self._rights = lefts, rights
+        boxes = np.array(boxes, dtype=float).reshape(-1, 4)
+        self._low_x, self._low_y, self._high_x, self._high_y = boxes.T.tolist()
+        self._leaf_of = np.empty(n, dtype=int)
+        for node, left in enumerate(lefts):
+            if left < 0:
+                self._leaf_of[order[starts[node]:ends[node]]] = node
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def _box_distance(self, node, x, y):
+        """ Distance from (x, y) to the bounding box of a node """
+        dx = max(self._low_x[node] - x, x - self._high_x[node], 0.0)
+        dy = max(self._low_y[node] - y, y - self._high_y[node], 0.0)
+        return hypot(dx, dy)
+
+    def _box_gap(self, node, other):
+        """ Distance between the bounding boxes of two nodes """
+        dx = max(self._low_x[other] - self._high_x[node], self._low_x[node] - self._high_x[other], 0.0)
+        dy = max(self._low_y[other] - self._high_y[node], self._low_y[node] - self._high_y[other], 0.0)
+        return hypot(dx, dy)
+
+    def _leaves(self, gap, bound):
+        """ Leaves in increasing order of gap(node), while gap(node) < bound()
+
+        bound is called again after each leaf, so that the caller can narrow
+        the search with what the leaves given so far contained.
+        """
+        if not len(self):
+            return
+        # ties go to the deepest node (children are numbered after their
+        # parent): duplicate cities are then found without opening every node
+        heap = [(gap(0), 0)]
+        while heap:
+            distance, node = heappop(heap)
+            node = abs(node)
+            if distance >= bound():
+                return
+            if self._lefts[node] < 0:
+                yield node
+            else:
+                for child in (self._lefts[node], self._rights[node]):
+                    heappush(heap, (gap(child), -child))
+
+    def _members(self, node):
+        return self._order[self._starts[node]:self._ends[node]]
+
+    def query_radius(self, point, radius):
+        """ Indices of the cities within radius of a point """
+        x, y = float(point[0]), float(point[1])
+        leaves = list(self._leaves(lambda node: self._box_distance(node, x, y),
+                                   lambda: np.nextafter(radius, inf)))
+        if not leaves:
+            return np.empty(0, dtype=self._order.dtype)
+        found = np.concatenate([self._members(leaf) for leaf in leaves])
+        gaps = self.coordinates[found] - (x, y)
+        return found[np.hypot(gaps[:, 0], gaps[:, 1]) <= radius]
+
+    def query_nearest(self, point, k, exclude=None):
+        """ Indices of the k cities nearest to a point, nearest first
+
+        Args:
+            point (tuple): (x, y) coordinates
+            k (int): number of cities
+            exclude (int, optional): index of a city to leave out (typically
+            the city at point)
+        """
+        x, y = float(point[0]), float(point[1])
+        found, distances = [], []
+        kth = [inf]
+        for leaf in self._leaves(lambda node: self._box_distance(node, x, y), lambda: kth[0]):
+            members = self._members(leaf)
+            if exclude is not None:
+                members = members[members != exclude]
+            gaps = self.coordinates[members] - (x, y)
+            found.append(members)
+            distances.append(np.hypot(gaps[:, 0], gaps[:, 1]))
+            if sum(map(len, found)) >= k > 0:
+                kth[0] = np.partition(np.concatenate(distances), k - 1)[k - 1]
+        if not found:
+            return np.empty(0, dtype=self._order.dtype)
+        found, distances = np.concatenate(found), np.concatenate(distances)
+        return found[np.argsort(distances, kind='stable')[:k]]
+
+    def nearest_neighbours(self, k, group_size=64):
+        """ The k nearest cities of every city, nearest first
+
+        The cities of each subtree of at most group_size cities are compared
+        at once with the cities of the leaves around it: first the nearest
+        leaves until they hold k cities, which bounds the distance of the
+        k-th neighbour, then all the leaves closer than that bound. The
+        blocks of distances stay of at most group_size rows whatever the
+        layout of the cities.
+
+        Returns:
+            list[list[int]]: the neighbours of each city
+        """
+        n = len(self)
+        k = min(k, n - 1)
+        if k <= 0:
+            return [[] for _ in range(n)]
+        neighbours = [None] * n
+        for group in self._groups(group_size):
+            members = self._members(group)
+            points = self.coordinates[members]
+            best = np.empty((len(members), 0))
+            best_cities = np.empty((len(members), 0), dtype=self._order.dtype)
+
+            def merge(leaves):
+                """ Keeps the k nearest of best and of the cities of leaves """
+                candidates = np.concatenate([self._members(leaf) for leaf in leaves])
+                gaps = points[:, None, :] - self.coordinates[candidates][None, :, :]
+                distances = np.hypot(gaps[..., 0], gaps[..., 1])
+                distances[members[:, None] == candidates[None, :]] = inf
+                distances = np.hstack((best, distances))
+                cities = np.hstack((best_cities, np.broadcast_to(candidates, distances[:, best.shape[1]:].shape)))
+                nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                return np.take_along_axis(distances, nearest, axis=1), np.take_along_axis(cities, nearest, axis=1)
+
+            kth = [inf]
+            leaves, nb_candidates = [], 0
+            for leaf in self._leaves(lambda node: self._box_gap(group, node), lambda: kth[0]):
+                leaves.append(leaf)
+                nb_candidates += self._ends[leaf] - self._starts[leaf]
+                if kth[0] == inf and nb_candidates >= len(members) + k:
+                    # every member has k other candidates now: the farthest
+                    # k-th of them bounds the leaves left to search
+                    best, best_cities = merge(leaves)
+                    kth[0] = best.max()
+                    leaves = []
+            if leaves:
+                best, best_cities = merge(leaves)
+            order = np.argsort(best, axis=1, kind='stable')
+            rows = np.take_along_axis(best_cities, order, axis=1).tolist()
+            for city, row in zip(members.tolist(), rows):
+                neighbours[city] = row
+        return neighbours
+
+    def _groups(self, size):
+        """ The largest subtrees of at most size cities (or the leaves) """
+        stack = [0] if len(self) else []
+        while stack:
+            node = stack.pop()
+            if self._ends[node] - self._starts[node] <= size or self._lefts[node] < 0:
+                yield node
+            else:
+                stack += [self._lefts[node], self._rights[node]]
+
+    def greedy_road(self, start=0):
+        """ Nearest neighbour road: from start, always go to the closest
+        city not visited yet
+
+        Each step searches the leaf of the current city, then the other
+        child of its ancestors until the closest city found so far is closer
+        than the edges of the ancestor's box, skipping the subtrees whose
+        cities were all visited.
+
+        Returns:
+            list[int]: the city indices in the order of the road
+        """
+        x, y = self._x_y()
+        lefts, rights, parents = self._lefts, self._rights, self._parents
+        low_x, low_y, high_x, high_y = self._low_x, self._low_y, self._high_x, self._high_y
+        members = [self._members(node).tolist() if left < 0 else None
+                   for node, left in enumerate(lefts)]
+        leaf_of = self._leaf_of.tolist()
+        remaining = [end - start for start, end in zip(self._starts, self._ends)]
+        visited = [False] * len(self)
+
+        def visit(city):
+            visited[city] = True
+            node = leaf_of[city]
+            while node >= 0:
+                remaining[node] -= 1
+                node = parents[node]
+
+        road = [start]
+        visit(start)
+        current = start
+        for _ in range(len(self) - 1):
+            px, py = x[current], y[current]
+            best, best_distance = None, inf
+            node = leaf_of[current]
+            stack = [node]
+            while True:
+                while stack:
+                    top = stack.pop()
+                    if not remaining[top]:
+                        continue
+                    dx = max(low_x[top] - px, px - high_x[top], 0.0)
+                    dy = max(low_y[top] - py, py - high_y[top], 0.0)
+                    if hypot(dx, dy) >= best_distance:
+                        continue
+                    if lefts[top] >= 0:
+                        stack += (lefts[top], rights[top])
+                        continue
+                    for city in members[top]:
+                        if not visited[city]:
+                            d = hypot(x[city] - px, y[city] - py)
+                            if d < best_distance:
+                                best, best_distance = city, d
+                # the cities outside the box of node are farther than its edges
+                if best_distance <= min(px - low_x[node], high_x[node] - px,
+                                        py - low_y[node], high_y[node] - py):
+                    break
+                parent = parents[node]
+                if parent < 0:
+                    break
+                stack = [rights[parent] if lefts[parent] == node else lefts[parent]]
+                node = parent
+            road.append(best)
+            visit(best)
+            current = best
+        return road
+
+    def _x_y(self):
+        return self.coordinates[:, 0].tolist(), self.coordinates[:, 1].tolist()
+
+
 if __name__ == '__main__':
     city_dict = load_cities("cities.txt")
     print(city_dict)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark of the TSProblem crossover operators
+
+Prints the mean cost of creating one child (crossover only, without the
+fitness evaluation) for growing road lengths, next to the former
+list-membership crossover for reference.
+
+    python crossover_benchmark.py [--sizes 100 200 500 1000 2000]
+"""
+import argparse
+import random
+import timeit
+
+import cities
+from ga_solver import Individual
+from tsp_problem import TSProblem
+
+
+def legacy_crossover(parents):
+    """The former crossover: O(n^2) list membership tests"""
+    parent_a, parent_b = parents[0].chromosome, parents[1].chromosome
+    child_chrom = parent_a[:len(parent_a) // 2]
+    for city in parent_b:
+        if city not in child_chrom:
+            child_chrom.append(city)
+    return child_chrom
+
+
+def time_per_child(function, parents, min_time=0.2):
+    """Mean duration (in seconds) of function(parents)"""
+    timer = timeit.Timer(lambda: function(parents))
+    number, total = timer.autorange()
+    while total < min_time:
+        number *= 2
+        total = timer.timeit(number)
+    return total / number
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[50, 100, 200, 500, 1000, 2000])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    operators = list(TSProblem.CROSSOVER_OPERATORS)
+    print(f"{'cities':>8}" + "".join(f"{name + ' (us)':>14}" for name in operators + ['legacy']))
+    for nb_cities in args.sizes:
+        problem = TSProblem(cities.generate_cities(nb_cities), num_cities=None)
+        # leave the children unrated: only the crossover is measured
+        problem.defer_evaluation = True
+        parents = [Individual(random.sample(range(nb_cities), nb_cities), None)
+                   for _ in range(2)]
+        costs = []
+        for operator in operators:
+            problem.crossover_operator = operator
+            costs.append(time_per_child(problem.crossover, parents))
+        costs.append(time_per_child(legacy_crossover, parents))
+        print(f"{nb_cities:>8}" + "".join(f"{cost * 1e6:>14.1f}" for cost in costs))
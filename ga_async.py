@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio variant of the generic genetic algorithm solver
+
+AsyncGASolver is meant for problems whose fitness is I/O bound (a scoring
+service for instance): instead of waiting for one rating after another, it
+rates all the new individuals of a generation concurrently, with at most
+max_concurrency requests in flight, optionally grouped in batches, each one
+with a timeout. The problem hooks (create_individual, select_parents,
+crossover, mutate, evaluate, evaluate_batch) may be coroutine functions.
+
+    solver = AsyncGASolver(problem, max_concurrency=32, timeout=5.0)
+    await solver.reset_population()
+    await solver.evolve_until(max_nb_of_generations=100)
+"""
+import asyncio
+import inspect
+import time
+
+import numpy as np
+
+from ga_solver import ChromosomeIndex, GAProblem, GASolver, _deferring_evaluation
+
+
+async def _resolve(value):
+    """Result of a problem hook, awaited if it is a coroutine"""
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+async def _gather(coroutines):
+    """asyncio.gather of some coroutines, cancelling (and awaiting) those
+    still running when one of them raises, so that none keeps its
+    semaphore slot in the background"""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class AsyncGASolver(GASolver):
+    """GASolver whose generations rate their individuals concurrently"""
+
+    def __init__(self, problem: GAProblem, max_concurrency=16, batch_size=None,
+                 timeout=None, retries=0, timeout_fitness=None, **solver_options):
+        """Initializes an asynchronous solver for a given GAProblem
+
+        The problem creates its individuals without rating them
+        (defer_evaluation); they are then rated by problem.evaluate (one
+        call per individual), or by problem.evaluate_batch when the problem
+        does not implement evaluate or when batch_size is given.
+
+        Args:
+            problem (GAProblem): GAProblem to be solved
+            max_concurrency (int, optional): Maximum number of ratings (calls
+                to evaluate or evaluate_batch) in progress at the same time.
+                Defaults to 16.
+            batch_size (int, optional): Number of chromosomes per call to
+                evaluate_batch. Defaults to None (one call per individual
+                with evaluate, all the individuals at once with
+                evaluate_batch).
+            timeout (float, optional): Seconds allowed to each call.
+                Defaults to None (no limit).
+            retries (int, optional): Number of new attempts after a timeout.
+                Defaults to 0.
+            timeout_fitness (float, optional): Fitness given to individuals
+                whose rating timed out on every attempt. Defaults to None
+                (the asyncio.TimeoutError is raised).
+            solver_options: Other arguments of GASolver (selection_rate,
+                mutation_rate, pop_size, selection, population_storage...);
+                n_workers is not supported.
+        """
+        if solver_options.get('n_workers') is not None:
+            raise ValueError("AsyncGASolver does not use worker processes")
+        solver_options['batch_evaluation'] = True
+        super().__init__(problem, **solver_options)
+        self._max_concurrency = max_concurrency
+        self._batch_size = batch_size
+        self._timeout = timeout
+        self._retries = retries
+        self._timeout_fitness = timeout_fitness
+        self._per_individual = (batch_size is None and
+                                type(problem).evaluate is not GAProblem.evaluate)
+
+    async def _call(self, semaphore, make_call, nb_individuals):
+        """Runs make_call() under the concurrency limit and the timeout
+
+        Returns:
+            the result of the call, or the timeout_fitness of its
+            individuals once every attempt timed out
+        """
+        for attempt in range(self._retries + 1):
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(_resolve(make_call()), self._timeout)
+                except asyncio.TimeoutError:
+                    if attempt == self._retries and self._timeout_fitness is None:
+                        raise
+        if self._per_individual:
+            return self._timeout_fitness
+        return [self._timeout_fitness] * nb_individuals
+
+    async def _evaluate_pending_async(self, population, start=0):
+        """Rates concurrently the individuals of population[start:] whose
+        fitness is still None
+
+        Returns:
+            int: the number of rated individuals
+        """
+        if self._array_storage:
+            pending = population.pending(start).tolist()
+        else:
+            pending = [i for i in range(start, len(population))
+                       if population[i].fitness is None]
+        if not pending:
+            return 0
+        problem = self._problem
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        if self._per_individual:
+            chromosomes = [population[i].chromosome for i in pending]
+            fitnesses = await _gather(
+                self._call(semaphore, lambda c=chromosome: problem.evaluate(c), 1)
+                for chromosome in chromosomes)
+        else:
+            if self._array_storage:
+                encoded = population.chromosomes[pending]
+            else:
+                encoded = np.array([problem.encode_chromosome(population[i].chromosome)
+                                    for i in pending])
+            size = self._batch_size or len(pending)
+            batches = [encoded[i:i + size] for i in range(0, len(pending), size)]
+            results = await _gather(
+                self._call(semaphore, lambda b=batch: problem.evaluate_batch(b), len(batch))
+                for batch in batches)
+            fitnesses = [f for result in results for f in np.asarray(result, dtype=float).tolist()]
+        if self._array_storage:
+            population.fitness[pending] = fitnesses
+        else:
+            for i, fitness in zip(pending, fitnesses):
+                population[i].fitness = float(fitness)
+        return len(pending)
+
+    @_deferring_evaluation
+    async def reset_population(self):
+        """Initialise the population with random individuals, rated
+        concurrently"""
+        population = self._empty_population()
+        self._generation = 0
+        self._nb_evaluations = self._population_size
+        self._nb_duplicates = 0
+        index = None if self._deduplicate is None else ChromosomeIndex(self._problem)
+        for _ in range(self._population_size):
+            indiv = await _resolve(self._problem.create_individual())
+            if index is not None:
+                indiv = await self._deduplicated_async(index, indiv)
+            population.append(indiv)
+        await self._evaluate_pending_async(population)
+        self._best = None
+        self._update_population(population, np.empty(0), index)
+
+    async def _deduplicated_async(self, index, individual, selected=None):
+        """GASolver._deduplicated, awaiting the problem hooks"""
+        problem = self._problem
+        key = index.key(individual.chromosome)
+        for _ in range(self._duplicate_attempts):
+            if key not in index:
+                break
+            self._nb_duplicates += 1
+            if self._deduplicate == 'replace' or selected is None:
+                individual = await _resolve(problem.create_individual())
+            else:
+                parents = await _resolve(problem.select_parents(selected))
+                child = await _resolve(problem.crossover(parents))
+                individual = await _resolve(problem.mutate(child, 1.0))
+            key = index.key(individual.chromosome)
+        index.append(key)
+        return individual
+
+    @_deferring_evaluation
+    async def evolve_for_one_generation(self):
+        """Same generation as GASolver.evolve_for_one_generation, with the
+        children rated concurrently
+
+        The children are bred one after another (so that the random draws
+        keep their order), then all rated at once. With observers, the
+        timings are split into survivors, breeding, evaluation and
+        local_search.
+        """
+        timed = bool(self._observers)
+        if timed:
+            timings = dict.fromkeys(self.PHASES, 0.0)
+            start = clock = time.perf_counter()
+
+        num_selected = int(len(self._population) * self._selection_rate)
+        survivors = self._select_survivors(num_selected)
+        if self._array_storage:
+            selected = self._population.take(survivors)
+            new_population = self._population.next_generation(survivors)
+        else:
+            selected = [self._population[i] for i in survivors]
+            new_population = selected.copy()
+        index = None if self._index is None else self._index.take(survivors)
+        self._nb_duplicates = 0
+        if timed:
+            timings['survivors'], clock = time.perf_counter() - clock, time.perf_counter()
+
+        problem = self._problem
+        nb_children = self._population_size - len(new_population)
+        mutations = self._rng.generator.random(max(nb_children, 0)) < self._mutation_rate
+        for mutation in mutations.tolist():
+            parents = await _resolve(problem.select_parents(selected))
+            child = await _resolve(problem.crossover(parents))
+            if mutation:
+                child = await _resolve(problem.mutate(child, 1.0))
+            if index is not None:
+                child = await self._deduplicated_async(index, child, selected)
+            new_population.append(child)
+        if timed:
+            timings['breeding'], clock = time.perf_counter() - clock, time.perf_counter()
+
+        nb_evaluations = await self._evaluate_pending_async(new_population, num_selected)
+        self._update_population(new_population, self._fitness[survivors], index)
+        self._generation += 1
+        self._nb_evaluations += nb_evaluations
+        if timed:
+            timings['evaluation'], clock = time.perf_counter() - clock, time.perf_counter()
+
+        if self._local_search_fraction > 0:
+            self._apply_local_search()
+            if timed:
+                timings['local_search'] = time.perf_counter() - clock
+        if self._checkpoint_file is not None and \
+                self._generation % self._checkpoint_interval == 0:
+            self.save_checkpoint()
+        if timed:
+            self._notify_observers(timings, nb_evaluations, time.perf_counter() - start)
+
+    async def evolve_until(self, max_nb_of_generations=500, threshold_fitness=None,
+                           resume=False, stopping=None, controller=None):
+        """Asynchronous GASolver.evolve_until (same arguments and result)"""
+        stopping, stop = self._start_run(resume, stopping, controller, threshold_fitness)
+        for generation in range(self._generation - self._run_start, max_nb_of_generations):
+            if stop is not None:
+                break
+            await self.evolve_for_one_generation()
+            stop = self._end_of_generation(generation, threshold_fitness, stopping, controller)
+        self._end_run()
+        return "maximum number of generations reached" if stop is None else stop
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Stopping policies and adaptive parameter control of the generic genetic
+algorithm module
+
+Stopping policies end GASolver.evolve_until before max_nb_of_generations
+(converged run, exhausted time or evaluation budget, solution found).
+A rate controller changes the selection and mutation rates between the
+generations according to the diversity of the population.
+
+    solver.evolve_until(1000, stopping=[NoImprovement(50), WallClock(600)],
+                        controller=DiversityControl())
+"""
+import time
+
+
+class _RunComponent:
+    """State shared by the stopping policies and the rate controllers: it is
+    saved in the checkpoints of GASolver, so that a resumed run stops and
+    adapts its rates as the uninterrupted one would have"""
+
+    def get_state(self):
+        """State of the object during a run (see set_state)
+
+        Returns:
+            dict: picklable copy of its run state, the attributes set by
+            reset (named with an underscore); the settings given to the
+            constructor are not saved, a resumed run keeps those it is
+            given
+        """
+        return {name: value for name, value in vars(self).items() if name.startswith('_')}
+
+    def set_state(self, state):
+        """Restores a state given by get_state; called instead of reset when
+        evolve_until resumes from a checkpoint"""
+        vars(self).update(state)
+
+
+class StoppingPolicy(_RunComponent):
+    """Base class of the stopping policies of GASolver.evolve_until"""
+
+    def reset(self, solver):
+        """Called when evolve_until starts (budgets count from there)
+
+        Args:
+            solver (GASolver): the solver about to evolve
+        """
+        pass
+
+    def check(self, solver, generation):
+        """Called after each generation of evolve_until
+
+        Args:
+            solver (GASolver): the evolving solver
+            generation (int): number of the generation in this run
+
+        Returns:
+            str: why the run must stop, or None to go on
+        """
+        return None
+
+
+class NoImprovement(StoppingPolicy):
+    """Stops when the best fitness did not improve for some generations"""
+
+    def __init__(self, generations, min_delta=0.0):
+        """
+        Args:
+            generations (int): generations without improvement before stopping
+            min_delta (float, optional): smallest increase of the best
+            fitness counted as an improvement. Defaults to 0.0.
+        """
+        self.generations = generations
+        self.min_delta = min_delta
+
+    def reset(self, solver):
+        best = solver.get_best_individual()
+        self._best = None if best is None else best.fitness
+        self._stagnation = 0
+
+    def check(self, solver, generation):
+        fitness = solver.get_best_individual().fitness
+        if self._best is None or fitness > self._best + self.min_delta:
+            self._best = fitness
+            self._stagnation = 0
+            return None
+        self._stagnation += 1
+        if self._stagnation >= self.generations:
+            return f"no improvement for {self._stagnation} generations"
+        return None
+
+
+class WallClock(StoppingPolicy):
+    """Stops when the run has lasted some seconds"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def reset(self, solver):
+        self._deadline = time.perf_counter() + self.seconds
+
+    def get_state(self):
+        # a deadline of perf_counter is meaningless in another process: the
+        # time left is saved instead
+        return {'left': self._deadline - time.perf_counter()}
+
+    def set_state(self, state):
+        self._deadline = time.perf_counter() + state['left']
+
+    def check(self, solver, generation):
+        if time.perf_counter() >= self._deadline:
+            return f"time budget of {self.seconds} s exhausted"
+        return None
+
+
+class EvaluationBudget(StoppingPolicy):
+    """Stops when the run has computed a number of fitness values (see
+    GASolver.get_evaluation_count)"""
+
+    def __init__(self, max_evaluations):
+        self.max_evaluations = max_evaluations
+
+    def reset(self, solver):
+        self._start = solver.get_evaluation_count()
+
+    def check(self, solver, generation):
+        if solver.get_evaluation_count() - self._start >= self.max_evaluations:
+            return f"budget of {self.max_evaluations} evaluations exhausted"
+        return None
+
+
+class SolutionFound(StoppingPolicy):
+    """Stops when GAProblem.is_solution_found accepts the best individual"""
+
+    def check(self, solver, generation):
+        if solver.get_problem().is_solution_found(solver.get_best_individual(), generation):
+            return "solution found"
+        return None
+
+
+class RateController(_RunComponent):
+    """Base class of the controllers adapting the rates of a GASolver
+    between generations (see GASolver.evolve_until)"""
+
+    def reset(self, solver):
+        """Called when evolve_until starts"""
+        pass
+
+    def update(self, solver, generation):
+        """Called after each generation, before the stopping policies; may
+        change the rates with solver.set_rates"""
+        pass
+
+    def finish(self, solver):
+        """Called when evolve_until ends"""
+        pass
+
+
+class DiversityControl(RateController):
+    """Raises the mutation rate and lowers the selection rate when the
+    population loses its diversity, and moves them back when it is diverse
+    again
+
+    A converged population then keeps fewer survivors (mostly copies of
+    each other) and breeds more, more mutated, children to leave the
+    plateau; a diverse one is exploited with the usual rates (those of the
+    solver when evolve_until started, given back to it when the run ends).
+    The rates move by a constant factor per generation, within their bounds
+    on the way out (a usual rate already beyond its bound stays where it
+    is) and up to the usual rates on the way back.
+    """
+
+    def __init__(self, target_diversity=0.5, factor=1.2,
+                 mutation_bounds=(0.01, 0.5), selection_bounds=(0.3, 0.6)):
+        """
+        Args:
+            target_diversity (float, optional): wanted value of
+                GASolver.population_diversity. Defaults to 0.5.
+            factor (float, optional): multiplier applied to the rates at
+                each generation. Defaults to 1.2.
+            mutation_bounds (tuple, optional): lowest and highest mutation
+                rate. Defaults to (0.01, 0.5).
+            selection_bounds (tuple, optional): lowest and highest selection
+                rate. Defaults to (0.3, 0.6).
+        """
+        self.target_diversity = target_diversity
+        self.factor = factor
+        self.mutation_bounds = mutation_bounds
+        self.selection_bounds = selection_bounds
+
+    def reset(self, solver):
+        self._usual_rates = solver.get_rates()
+
+    def update(self, solver, generation):
+        selection_rate, mutation_rate = solver.get_rates()
+        if solver.population_diversity() >= self.target_diversity:
+            usual_selection, usual_mutation = self._usual_rates
+            solver.set_rates(selection_rate=_toward(selection_rate, usual_selection, self.factor),
+                             mutation_rate=_toward(mutation_rate, usual_mutation, self.factor))
+        else:
+            solver.set_rates(
+                selection_rate=_lower(selection_rate, self.factor, self.selection_bounds[0]),
+                mutation_rate=_raise(mutation_rate, self.factor, self.mutation_bounds[1]))
+
+    def finish(self, solver):
+        # the next run starts again from the configured rates
+        usual_selection, usual_mutation = self._usual_rates
+        solver.set_rates(selection_rate=usual_selection, mutation_rate=usual_mutation)
+
+
+def _lower(value, factor, low):
+    """value divided by factor, but not below low (nor raised up to it)"""
+    return min(value, max(value / factor, low))
+
+
+def _raise(value, factor, high):
+    """value multiplied by factor, but not above high (nor lowered down to
+    it)"""
+    return max(value, min(value * factor, high))
+
+
+def _toward(value, target, factor):
+    """value multiplied or divided by factor to get closer to target,
+    without going past it"""
+    if value < target:
+        return min(value * factor, target)
+    return max(value / factor, target)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Observers of the generic genetic algorithm module
+
+An observer attached with GASolver.add_observer receives the statistics of
+every generation (fitness, diversity, evaluation count and phase timings).
+"""
+import json
+
+
+class GAObserver:
+    """Base class of the GASolver observers"""
+
+    def on_generation(self, solver, stats):
+        """Called by the solver after each generation
+
+        Args:
+            solver (GASolver): the observed solver
+            stats (dict): statistics of the generation (see
+            GASolver.add_observer)
+        """
+        pass
+
+
+class TraceObserver(GAObserver):
+    """Writes one compact JSON line per generation to a trace file
+
+    The file can be read back with read_trace. Use it as a context manager
+    or call close() to flush the file.
+    """
+
+    def __init__(self, filename, precision=6):
+        """Opens the trace file (overwritten)
+
+        Args:
+            filename (str): path of the trace file
+            precision (int, optional): number of significant digits kept for
+            the floating point values. Defaults to 6.
+        """
+        self._file = open(filename, 'w')
+        self._precision = precision
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Closes the trace file"""
+        self._file.close()
+
+    def _round(self, value):
+        if isinstance(value, float):
+            return float(f"{value:.{self._precision}g}")
+        if isinstance(value, dict):
+            return {key: self._round(v) for key, v in value.items()}
+        return value
+
+    def on_generation(self, solver, stats):
+        self._file.write(json.dumps(self._round(stats), separators=(',', ':')) + '\n')
+
+
+def read_trace(filename):
+    """Reads a trace file written by TraceObserver
+
+    Returns:
+        list[dict]: the statistics of every generation
+    """
+    with open(filename) as file:
+        return [json.loads(line) for line in file if line.strip()]
@@ -8,11 +8,25 @@ Template file for your Exercise 3 submission
 (generic genetic algorithm module)
 """
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import functools
+import inspect
+import os
+import pickle
 import random
+import time
+import numpy as np
+
+import ga_control
 
 class Individual:
     """Represents an Individual for a genetic algorithm"""
 
+    __slots__ = ('chromosome', 'fitness')
+
     def __init__(self, chromosome: list, fitness: float):
         """Initializes an Individual for a genetic algorithm
 
@@ -31,11 +45,247 @@ class Individual:
 
     def __repr__(self):
         """Representation of the object for print calls"""
+        if self.fitness is None:
+            return f'Indiv(None,{self.chromosome})'
         return f'Indiv({self.fitness:.1f},{self.chromosome})'
 
 
+class FitnessCache:
+    """Bounded memory of already computed fitness values
+
+    Chromosomes are keyed by their tuple form (lookup) or, for the rows of
+    a 2D array, by the bytes of the row (lookup_batch): the two keys never
+    match, so a problem should go through one of them only. When the cache
+    is full, the least recently used value is forgotten.
+    """
+
+    def __init__(self, maxsize=4096):
+        """Initializes an empty cache
+
+        Args:
+            maxsize (int, optional): maximum number of remembered values.
+            Defaults to 4096.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._values = OrderedDict()
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        """Forgets every value and resets the counters"""
+        self._values.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hit_rate(self):
+        """Fraction of the lookups answered from the cache"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _remember(self, key, fitness):
+        self._values[key] = fitness
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def lookup(self, chromosome, rate):
+        """Returns the fitness of a chromosome, calling rate(chromosome) only
+        if it is not known yet"""
+        key = tuple(chromosome)
+        fitness = self._values.get(key)
+        if fitness is not None:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return fitness
+        self.misses += 1
+        fitness = rate(chromosome)
+        self._remember(key, fitness)
+        return fitness
+
+    def lookup_batch(self, chromosomes, rate_batch):
+        """Returns the fitness of each row of a 2D array of chromosomes,
+        calling rate_batch once on the rows that are not known yet"""
+        chromosomes = np.ascontiguousarray(chromosomes)
+        # one bytes object per row, made in bulk (no Python tuple of genes)
+        row = np.dtype((np.void, chromosomes.dtype.itemsize * chromosomes.shape[1]))
+        keys = chromosomes.view(row).ravel().tolist()
+        fitnesses = [self._values.get(key) for key in keys]
+        missing = [i for i, fitness in enumerate(fitnesses) if fitness is None]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        for key, fitness in zip(keys, fitnesses):
+            if fitness is not None:
+                self._values.move_to_end(key)
+        if missing:
+            computed = np.asarray(rate_batch(chromosomes[missing])).tolist()
+            for i, fitness in zip(missing, computed):
+                fitnesses[i] = fitness
+                self._remember(keys[i], fitness)
+        return np.array(fitnesses)
+
+
+class RandomStream(random.Random):
+    """Random generator of a solver or problem, independent of the random
+    module
+
+    It has all the methods of random.Random for single draws, a NumPy
+    Generator (the generator attribute) for batch draws, and spawns
+    independent substreams for parallel workers and islands.
+    """
+
+    def seed(self, a=None, version=2):
+        """Reseeds the stream from an integer, a numpy.random.SeedSequence
+        (as given by spawn) or None (fresh entropy)"""
+        if a is None:
+            a = np.random.SeedSequence()
+        if isinstance(a, np.random.SeedSequence):
+            self._seed_sequence = a
+            super().seed(int.from_bytes(a.generate_state(4).tobytes(), 'little'))
+        else:
+            # the SeedSequence is only built if the NumPy generator or
+            # substreams are needed (reseeding stays cheap)
+            self._seed_sequence = None
+            super().seed(a, version)
+        self._seed = a
+        self._generator = None
+
+    @property
+    def seed_sequence(self):
+        if self._seed_sequence is None:
+            self._seed_sequence = np.random.SeedSequence(self._seed)
+        return self._seed_sequence
+
+    @property
+    def generator(self):
+        """numpy.random.Generator of the stream, for batch draws"""
+        if self._generator is None:
+            self._generator = np.random.Generator(np.random.PCG64(self.seed_sequence))
+        return self._generator
+
+    def spawn(self, n):
+        """Creates n new streams, independent of this one and of each other
+
+        Returns:
+            list[RandomStream]: the substreams (the same ones for the same
+            seed and spawn history)
+        """
+        return [RandomStream(child) for child in self.seed_sequence.spawn(n)]
+
+    def getstate(self):
+        sequence = self.seed_sequence
+        return (super().getstate(),
+                (sequence.entropy, sequence.spawn_key, sequence.pool_size,
+                 sequence.n_children_spawned),
+                None if self._generator is None else self._generator.bit_generator.state)
+
+    def setstate(self, state):
+        random_state, (entropy, spawn_key, pool_size, nb_spawned), generator_state = state
+        super().setstate(random_state)
+        self._seed_sequence = np.random.SeedSequence(
+            entropy, spawn_key=spawn_key, pool_size=pool_size, n_children_spawned=nb_spawned)
+        self._seed = None
+        self._generator = None
+        if generator_state is not None:
+            self.generator.bit_generator.state = generator_state
+
+
+def random_stream(rng=None):
+    """Gives the RandomStream to use for an rng argument
+
+    Args:
+        rng: a RandomStream (used as is), an integer seed, or None (seeded
+            from the random module, so that random.seed still makes runs
+            reproducible)
+
+    Returns:
+        RandomStream: the stream
+    """
+    if isinstance(rng, RandomStream):
+        return rng
+    if rng is None:
+        rng = random.getrandbits(64)
+    return RandomStream(rng)
+
+
+class ChromosomeIndex:
+    """Hash index of the chromosomes of a population, in population order
+
+    Chromosomes are indexed by their canonical form (see
+    GAProblem.canonical_chromosome), so that the individuals describing the
+    same solution are found in O(1) and the number of distinct ones is
+    always known.
+    """
+
+    def __init__(self, problem, chromosomes=()):
+        """Indexes some chromosomes
+
+        Args:
+            problem (GAProblem): problem giving the canonical forms
+            chromosomes (iterable, optional): chromosomes of the population.
+                Defaults to none.
+        """
+        self._problem = problem
+        self._keys = []
+        self._counts = {}
+        for chromosome in chromosomes:
+            self.append(self.key(chromosome))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._counts
+
+    def key(self, chromosome):
+        """Canonical form of a chromosome"""
+        return self._problem.canonical_chromosome(chromosome)
+
+    def nb_distinct(self):
+        """Number of distinct chromosomes"""
+        return len(self._counts)
+
+    def append(self, key):
+        """Indexes the canonical form of the next individual"""
+        self._keys.append(key)
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def replace(self, position, key):
+        """Changes the canonical form of the individual at a position"""
+        old = self._keys[position]
+        if self._counts[old] == 1:
+            del self._counts[old]
+        else:
+            self._counts[old] -= 1
+        self._keys[position] = key
+        self._counts[key] = self._counts.get(key, 0) + 1
+
+    def take(self, positions):
+        """New index of the individuals at the given positions (in that
+        order)"""
+        index = ChromosomeIndex(self._problem)
+        for position in positions:
+            index.append(self._keys[position])
+        return index
+
+
 class GAProblem:
     """Abstract interface defining the operations needed to solve a problem with a genetic algorithm"""
+
+    # Opt-in memory of the computed fitness values (see cached_fitness)
+    fitness_cache = None
+
+    # Generator of every random draw of the problem. Problems set their own
+    # RandomStream (see random_stream); GASolver reseeds it per individual
+    # when breeding in worker processes.
+    rng = random
+
+    # Set by GASolver, while it breeds, when it rates new individuals with
+    # evaluate_batch: create_individual, crossover and mutate may then leave
+    # fitness to None (the problem is restored afterwards)
+    defer_evaluation = False
+
     @abstractmethod
     def create_individual(self):
         """Creates a valid random individual for the problem.
@@ -73,6 +323,10 @@ class GAProblem:
     def mutate(self, individual, mutation_rate):
         """Applies a mutation to an individual with a certain probability.
 
+            GASolver decides itself which children mutate (one batch draw
+            per generation, or one draw from the seed of each child with
+            n_workers) and calls mutate with a probability of 1.0.
+
             Args:
             individual: The individual to potentially mutate.
             mutation_rate (float): Probability of mutation.
@@ -95,65 +349,811 @@ class GAProblem:
         """
         pass
 
+    def improve(self, individual, max_moves=None, deadline=None):
+        """Applies a local search to an individual (optional).
+
+            Used by GASolver when local_search_fraction is set. The default
+            leaves the individual unchanged.
+
+            Args:
+            individual (Individual): The (rated) individual to improve.
+            max_moves (int, optional): Maximum number of improving moves.
+            deadline (float, optional): time.perf_counter() value after which
+                the search must stop.
+
+            Returns:
+            Individual: The improved individual (or the original one).
+        """
+        return individual
+
+    def cached_fitness(self, chromosome, rate):
+        """Returns rate(chromosome), going through fitness_cache if the
+        problem has one.
+
+            Args:
+            chromosome (list): The chromosome to rate.
+            rate (callable): Function computing the fitness of a chromosome.
+        """
+        if self.fitness_cache is None:
+            return rate(chromosome)
+        return self.fitness_cache.lookup(chromosome, rate)
+
+    def cached_fitness_batch(self, chromosomes, rate_batch):
+        """Batch version of cached_fitness, for evaluate_batch implementations.
+
+            Args:
+            chromosomes (numpy.ndarray): 2D array with one chromosome per row.
+            rate_batch (callable): Function computing the fitness of a 2D array
+                of chromosomes.
+        """
+        if self.fitness_cache is None:
+            return rate_batch(chromosomes)
+        return self.fitness_cache.lookup_batch(chromosomes, rate_batch)
+
+    def canonical_chromosome(self, chromosome):
+        """Hashable form of a chromosome, the same for all the chromosomes
+        describing the same solution (optional).
+
+            Used by GASolver to find duplicated individuals (see its
+            deduplicate argument). The default is the tuple of the genes.
+
+            Args:
+            chromosome (list): The chromosome.
+
+            Returns:
+            hashable: Its canonical form.
+        """
+        return tuple(chromosome)
+
+    def encode_chromosome(self, chromosome):
+        """Converts a chromosome into a sequence of integers (optional).
+
+            Used by the array population storage of GASolver and for batch
+            evaluation. The default keeps the chromosome unchanged, which
+            suits chromosomes that already are lists of integers.
+
+            Args:
+            chromosome (list): The chromosome to convert.
+
+            Returns:
+            list[int]: The encoded chromosome.
+        """
+        return chromosome
+
+    def decode_chromosome(self, encoded):
+        """Inverse of encode_chromosome.
+
+            Args:
+            encoded (numpy.ndarray): 1D array of integers.
+
+            Returns:
+            list: The chromosome.
+        """
+        return encoded.tolist()
+
+    def evaluate(self, chromosome):
+        """Computes the fitness of one chromosome (optional).
+
+            Used by ga_async.AsyncGASolver, which rates the new individuals
+            of a generation concurrently; it may then be a coroutine
+            function (async def).
+
+            Args:
+            chromosome (list): The chromosome to rate.
+
+            Returns:
+            float: Its fitness.
+        """
+        raise NotImplementedError
+
+    def evaluate_batch(self, chromosomes):
+        """Computes the fitness of many chromosomes at once (optional).
+
+            Problems overriding this method get their new individuals rated
+            by GASolver in one call per generation instead of one by one.
+
+            Args:
+            chromosomes (numpy.ndarray): 2D array with one chromosome per row,
+                encoded with encode_chromosome.
+
+            Returns:
+            numpy.ndarray: The fitness of each chromosome.
+        """
+        raise NotImplementedError
+
+
+
+class ArrayPopulation(Sequence):
+    """Population stored as one preallocated 2D array of encoded chromosomes
+    (see GAProblem.encode_chromosome) and one 1D array of fitness values
+
+    Indexing returns an Individual materialized on demand with
+    GAProblem.decode_chromosome. A generation is built in the spare arrays
+    of the previous one (see next_generation), so evolving does not allocate
+    new arrays; a population stays readable until the generation after the
+    next one has been started.
+    """
+
+    def __init__(self, problem, capacity, dtype=np.int32, buffers=None):
+        """Initializes an empty population
+
+        Args:
+            problem (GAProblem): problem encoding and decoding the chromosomes
+            capacity (int): maximum number of individuals
+            dtype (numpy.dtype, optional): integer type of the encoded
+            chromosomes. Defaults to numpy.int32.
+            buffers (tuple, optional): (chromosomes, fitness) arrays to reuse.
+            Defaults to None (allocated at the first append).
+        """
+        self._problem = problem
+        self._capacity = capacity
+        self._dtype = dtype
+        if buffers is None:
+            buffers = (None, np.empty(capacity))
+        self._chromosomes, self._fitness = buffers
+        self._spare = None
+        self._size = 0
+
+    @property
+    def chromosomes(self):
+        """2D array of the encoded chromosomes (one per row)"""
+        return self._chromosomes[:self._size]
+
+    @property
+    def fitness(self):
+        """1D array of the fitness values (NaN for unrated individuals)"""
+        return self._fitness[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("population index out of range")
+        fitness = self._fitness[index]
+        return Individual(self._problem.decode_chromosome(self._chromosomes[index]),
+                          None if np.isnan(fitness) else fitness.item())
+
+    def __setitem__(self, index, individual):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("population index out of range")
+        self._chromosomes[index] = self._problem.encode_chromosome(individual.chromosome)
+        self._fitness[index] = np.nan if individual.fitness is None else individual.fitness
+
+    def append(self, individual):
+        """Stores an individual after the current ones"""
+        if self._size == self._capacity:
+            raise IndexError("population is full")
+        encoded = self._problem.encode_chromosome(individual.chromosome)
+        if self._chromosomes is None:
+            self._chromosomes = np.empty((self._capacity, len(encoded)), dtype=self._dtype)
+        self._chromosomes[self._size] = encoded
+        self._fitness[self._size] = np.nan if individual.fitness is None else individual.fitness
+        self._size += 1
+
+    def take(self, indices):
+        """Sequence of the individuals at the given indices (materialized on
+        demand)"""
+        return _PopulationSubset(self, indices)
+
+    def pending(self, start=0):
+        """Indices of the unrated individuals from start"""
+        return np.flatnonzero(np.isnan(self._fitness[start:self._size])) + start
+
+    def next_generation(self, survivors):
+        """Starts the next generation in the spare arrays, with a copy of the
+        given survivors
+
+        Args:
+            survivors (numpy.ndarray): indices of the surviving individuals
+
+        Returns:
+            ArrayPopulation: the new population, ready for append
+        """
+        spare = self._spare
+        if spare is None or spare[0] is None:
+            spare = (None if self._chromosomes is None else np.empty_like(self._chromosomes),
+                     np.empty_like(self._fitness))
+        population = ArrayPopulation(self._problem, self._capacity, self._dtype, spare)
+        population._spare = (self._chromosomes, self._fitness)
+        count = len(survivors)
+        population._chromosomes[:count] = self._chromosomes[survivors]
+        population._fitness[:count] = self._fitness[survivors]
+        population._size = count
+        return population
+
+
+class _PopulationSubset(Sequence):
+    """Read-only sequence over some individuals of an ArrayPopulation"""
+
+    def __init__(self, population, indices):
+        self._population = population
+        self._indices = indices
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self._population[int(self._indices[index])]
+
+
+# Problem of the current worker process (see GASolver n_workers)
+_worker_problem = None
+
+
+def _init_worker(problem):
+    """Initializer of the worker processes: receives the problem once"""
+    global _worker_problem
+    _worker_problem = problem
+
+
+def _worker_pool(max_workers, problem):
+    """Pool of worker processes receiving the problem once (see
+    _init_worker); used by GASolver and island_model.IslandModel"""
+    # imported here: multiprocessing slows down the start of single-process
+    # runs
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                               initargs=(problem,))
+
+
+def _create_seeded(problem, defer_evaluation, seeds):
+    """Creates one random individual per seed"""
+    problem.defer_evaluation = defer_evaluation
+    individuals = []
+    for seed in seeds:
+        problem.rng.seed(seed)
+        individuals.append(problem.create_individual())
+    return individuals
+
+
+def _breed_seeded(problem, defer_evaluation, selected, mutation_rate, seeds):
+    """Creates one child per seed: parents selection, crossover and mutation
+
+    Each child only depends on its seed and on the selected individuals, so
+    the result does not depend on how the seeds are spread over workers.
+    Whether a child mutates is drawn here, first from its seed, and mutate
+    is called with a rate of 1.0, as in the breeding of GASolver without
+    workers.
+    """
+    problem.defer_evaluation = defer_evaluation
+    children = []
+    for seed in seeds:
+        problem.rng.seed(seed)
+        mutation = problem.rng.random() < mutation_rate
+        parents = problem.select_parents(selected)
+        child = problem.crossover(parents)
+        children.append(problem.mutate(child, 1.0) if mutation else child)
+    return children
+
+
+def _worker_create(defer_evaluation, seeds):
+    return _create_seeded(_worker_problem, defer_evaluation, seeds)
+
+
+def _worker_breed(defer_evaluation, selected, mutation_rate, seeds):
+    return _breed_seeded(_worker_problem, defer_evaluation, selected, mutation_rate, seeds)
+
+
+def _deferring_evaluation(method):
+    """Decorator of the GASolver methods calling the problem hooks: while
+    they run, problem.defer_evaluation tells whether the solver rates the new
+    individuals itself (see GASolver._deferred_evaluation)"""
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            with self._deferred_evaluation():
+                return await method(self, *args, **kwargs)
+    else:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self._deferred_evaluation():
+                return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _write_checkpoint(snapshot, filename):
+    """Pickles a GASolver snapshot to a temporary file, then moves it over
+    filename so that a crash never leaves a truncated checkpoint"""
+    temporary = filename + '.tmp'
+    with open(temporary, 'wb') as file:
+        pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, filename)
 
 
 class GASolver:
-    def __init__(self, problem: GAProblem, selection_rate=0.5, mutation_rate=0.1,pop_size=50):
+    # Phases of a generation timed for the observers (see add_observer)
+    PHASES = ('survivors', 'selection', 'crossover', 'mutation', 'breeding', 'evaluation',
+              'local_search')
+    # Strategies choosing the survivors of a generation
+    SELECTIONS = ('truncation', 'tournament', 'roulette')
+
+    def __init__(self, problem: GAProblem, selection_rate=0.5, mutation_rate=0.1,pop_size=50,
+                 batch_evaluation=None, n_workers=None, chunk_size=None,
+                 selection='truncation', tournament_size=3,
+                 population_storage='list', chromosome_dtype=np.int32,
+                 local_search_fraction=0.0, local_search_time=None, local_search_moves=None,
+                 checkpoint_file=None, checkpoint_interval=10, rng=None,
+                 deduplicate=None, duplicate_attempts=3):
         """Initializes an instance of a ga_solver for a given GAProblem
 
         Args:
             problem (GAProblem): GAProblem to be solved by this ga_solver
             selection_rate (float, optional): Selection rate between 0 and 1.0. Defaults to 0.5.
             mutation_rate (float, optional): mutation_rate between 0 and 1.0. Defaults to 0.1.
+            batch_evaluation (bool, optional): Rate the new individuals of each
+                generation with problem.evaluate_batch. Defaults to None (use
+                it when the problem implements it).
+            n_workers (int, optional): Number of worker processes creating
+                (and rating) the individuals. Defaults to None (everything
+                in this process, one child after another). With any number of
+                workers, each individual is created from its own seed drawn
+                from rng, so results under a fixed seed are identical
+                whatever the number of workers (1 runs in this process).
+            chunk_size (int, optional): Number of individuals per task sent
+                to a worker. Defaults to None (about 4 tasks per worker).
+            selection (str, optional): How the selection_rate survivors are
+                chosen: 'truncation' (the best ones), 'tournament' (each one
+                is the best of tournament_size random individuals) or
+                'roulette' (drawn with a probability growing with fitness).
+                The best individual always survives. Defaults to 'truncation'.
+            tournament_size (int, optional): Individuals per tournament.
+                Defaults to 3.
+            population_storage (str, optional): 'list' (a list of Individual
+                objects) or 'array' (an ArrayPopulation: encoded chromosomes
+                in one 2D array of chromosome_dtype, reused from one
+                generation to the next). Defaults to 'list'.
+            chromosome_dtype (numpy.dtype, optional): Integer type of the
+                encoded chromosomes of the array storage. Defaults to int32.
+            local_search_fraction (float, optional): Fraction of the best
+                individuals of each generation improved by problem.improve
+                (memetic algorithm). Defaults to 0.0 (no local search).
+            local_search_time (float, optional): Seconds of local search per
+                generation; the best individuals are improved first.
+                Defaults to None (no limit).
+            local_search_moves (int, optional): Maximum number of improving
+                moves per individual. Defaults to None (no limit).
+            checkpoint_file (str, optional): File receiving a checkpoint of
+                the run every checkpoint_interval generations (see
+                save_checkpoint). Defaults to None (no checkpoints).
+            checkpoint_interval (int, optional): Generations between two
+                checkpoints. Defaults to 10.
+            rng (optional): RandomStream or integer seed of the draws of the
+                solver (selection, mutation masks, seeds of the workers); the
+                problem draws from its own problem.rng. Defaults to None
+                (seeded from the random module, see random_stream).
+            deduplicate (str, optional): What becomes of a new individual
+                identical to one of the population (same canonical_chromosome):
+                'reject' (another child is bred, always mutated) or 'replace'
+                (a new random individual takes its place). Duplicates are
+                found before being rated, with a ChromosomeIndex that also
+                makes population_diversity O(1). Defaults to None (duplicates
+                are kept).
+            duplicate_attempts (int, optional): Maximum number of individuals
+                tried in place of a duplicate; the last one is kept even if
+                it is a duplicate too. Defaults to 3.
         """
+        if population_storage not in ('list', 'array'):
+            raise ValueError(f"Unknown population storage: {population_storage}")
+        if selection not in self.SELECTIONS:
+            raise ValueError(f"Unknown selection strategy: {selection}")
+        if deduplicate not in (None, 'reject', 'replace'):
+            raise ValueError(f"Unknown deduplication: {deduplicate}")
         self._problem = problem
         self._selection_rate = selection_rate
         self._mutation_rate = mutation_rate
         self._population = []
+        self._fitness = np.empty(0)
+        self._best = None
         self._population_size= pop_size
+        self._selection = selection
+        self._tournament_size = tournament_size
+        self._array_storage = population_storage == 'array'
+        self._chromosome_dtype = chromosome_dtype
+        self._local_search_fraction = local_search_fraction
+        self._local_search_time = local_search_time
+        self._local_search_moves = local_search_moves
+        if batch_evaluation is None:
+            batch_evaluation = type(problem).evaluate_batch is not GAProblem.evaluate_batch
+        self._batch_evaluation = batch_evaluation
+        self._n_workers = n_workers
+        self._chunk_size = chunk_size
+        self._executor = None
+        self._rng = random_stream(rng)
+        self._observers = []
+        self._generation = 0
+        self._nb_evaluations = 0
+        self._deduplicate = deduplicate
+        self._duplicate_attempts = duplicate_attempts
+        # ChromosomeIndex of the population, when deduplicating
+        self._index = None
+        # duplicates found during the last generation
+        self._nb_duplicates = 0
+        self._checkpoint_file = checkpoint_file
+        self._checkpoint_interval = checkpoint_interval
+        self._checkpoint_writer = None
+        self._checkpoint_pending = None
+        # generation at which the running evolve_until started
+        self._run_start = None
+        # stopping policies and rate controller of the running evolve_until
+        self._stopping = self._controller = None
+        self._resumed_run_state = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
+    def close(self):
+        """Shuts down the worker processes (if any) and waits for the last
+        checkpoint to be written"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._checkpoint_writer is not None:
+            self.wait_for_checkpoint()
+            self._checkpoint_writer.shutdown()
+            self._checkpoint_writer = None
+
+    def _run_seeded(self, count, task, *args):
+        """Runs task(problem, batch_evaluation, *args, seeds) over count fresh
+        seeds, split in chunks and spread over the worker processes, and
+        returns the concatenated results in seed order"""
+        seeds = self._rng.generator.integers(2**64, size=count, dtype=np.uint64).tolist()
+        args = (self._batch_evaluation,) + args
+        if self._n_workers == 1:
+            # same computation, in this process: keep the problem's sequence
+            state = self._problem.rng.getstate()
+            result = task(self._problem, *args, seeds)
+            self._problem.rng.setstate(state)
+            return result
+        
+        chunk_size = self._chunk_size or max(1, -(-count // (4 * self._n_workers)))
+        chunks = [seeds[i:i + chunk_size] for i in range(0, count, chunk_size)]
+        if self._executor is None:
+            self._executor = _worker_pool(self._n_workers, self._problem)
+        worker_task = _worker_create if task is _create_seeded else _worker_breed
+        futures = [self._executor.submit(worker_task, *args, chunk) for chunk in chunks]
+        return [indiv for future in futures for indiv in future.result()]
+
+    @contextmanager
+    def _deferred_evaluation(self):
+        """Sets problem.defer_evaluation to the evaluation mode of the solver,
+        and restores it afterwards: the problem keeps rating the individuals
+        it creates for its other users"""
+        problem = self._problem
+        previous = problem.defer_evaluation
+        problem.defer_evaluation = self._batch_evaluation
+        try:
+            yield
+        finally:
+            problem.defer_evaluation = previous
+
+    @_deferring_evaluation
     def reset_population(self):
         """Initialise the population with random  individu"""
-        self._population = []
-        for _ in range(self._population_size):
-            self._population.append(self._problem.create_individual())
+        population = self._empty_population()
+        self._generation = 0
+        self._nb_evaluations = self._population_size
+        self._nb_duplicates = 0
+        index = None if self._deduplicate is None else ChromosomeIndex(self._problem)
+        if self._n_workers is not None:
+            individuals = self._run_seeded(self._population_size, _create_seeded)
+        else:
+            individuals = (self._problem.create_individual()
+                           for _ in range(self._population_size))
+        for indiv in individuals:
+            if index is not None:
+                indiv = self._deduplicated(index, indiv)
+            population.append(indiv)
+        if not self._batch_evaluation:
+            self._nb_evaluations += self._nb_duplicates
+        self._evaluate_pending(population)
+        self._best = None
+        self._update_population(population, np.empty(0), index)
+
+    def _empty_population(self):
+        """New empty population in the configured storage"""
+        if self._array_storage:
+            return ArrayPopulation(self._problem, self._population_size, self._chromosome_dtype)
+        return []
+
+    def _evaluate_pending(self, population, start=0):
+        """Rates in one batch the individuals of population[start:] whose
+        fitness is still None
 
+        Returns:
+            int: the number of rated individuals
+        """
+        if not self._batch_evaluation:
+            return 0
+        if self._array_storage:
+            pending = population.pending(start)
+            if len(pending):
+                population.fitness[pending] = self._problem.evaluate_batch(
+                    population.chromosomes[pending])
+            return len(pending)
+        pending = [indiv for indiv in population[start:] if indiv.fitness is None]
+        if not pending:
+            return 0
+        chromosomes = np.array([self._problem.encode_chromosome(indiv.chromosome)
+                                for indiv in pending])
+        fitnesses = np.asarray(self._problem.evaluate_batch(chromosomes)).tolist()
+        for indiv, fitness in zip(pending, fitnesses):
+            indiv.fitness = fitness
+        return len(pending)
+
+    @_deferring_evaluation
     def evolve_for_one_generation(self):
         """Apply the process for one generation:
-- Sort the population (descending order)
-- Selection: Keep the best individuals
+- Selection: Keep the survivors (the best individuals with truncation)
 - Reproduction: Recreate the same number by crossing the survivors
-- Mutation: For each new individual, apply a mutation according to the rate
+- Mutation: Draw at once the new individuals mutated according to the rate
+- Evaluation: with batch evaluation, rate all the new individuals at once
+
+When observers are attached, each phase is timed and the observers receive
+the statistics of the new generation (see add_observer).
         """
-        # sort the population by fitness (descending order)
-        self._population.sort(reverse=True)
+        timed = bool(self._observers)
+        nb_evaluations = 0
+        if timed:
+            timings = dict.fromkeys(self.PHASES, 0.0)
+            start = clock = time.perf_counter()
         
-        # Sélection of best  individu
+        # Sélection of the survivors (without sorting the population)
         num_selected = int(len(self._population) * self._selection_rate)
-        selected = self._population[:num_selected]
+        survivors = self._select_survivors(num_selected)
         
         # Creation of the new population while retaining the best
-        new_population = selected.copy()
+        if self._array_storage:
+            selected = self._population.take(survivors)
+            new_population = self._population.next_generation(survivors)
+        else:
+            selected = [self._population[i] for i in survivors]
+            new_population = selected.copy()
+        index = None if self._index is None else self._index.take(survivors)
+        self._nb_duplicates = 0
+        if timed:
+            timings['survivors'], clock = time.perf_counter() - clock, time.perf_counter()
         
         # Reproduction until reaching the initial population size
-        while len(new_population) < self._population_size:
+        if self._n_workers is not None:
+            for indiv in self._run_seeded(
+                    self._population_size - len(new_population), _breed_seeded,
+                    list(selected), self._mutation_rate):
+                if index is not None:
+                    indiv = self._deduplicated(index, indiv, selected)
+                new_population.append(indiv)
+                if not self._batch_evaluation:
+                    nb_evaluations += 1
+            if timed:
+                # selection, crossover and mutation all happen in the workers
+                timings['breeding'], clock = time.perf_counter() - clock, time.perf_counter()
+        # the children to mutate, drawn all at once
+        nb_children = self._population_size - len(new_population)
+        mutations = self._rng.generator.random(max(nb_children, 0)) < self._mutation_rate
+        for mutation in mutations.tolist():
             # Selection of parents and creation of a new individual by crossing
             parents = self._problem.select_parents(selected)
+            if timed:
+                now = time.perf_counter()
+                timings['selection'] += now - clock
+                clock = now
             new_individual = self._problem.crossover(parents)
+            if timed:
+                now = time.perf_counter()
+                timings['crossover'] += now - clock
+                clock = now
             
-            # Mutation 
-            new_individual = self._problem.mutate(new_individual, self._mutation_rate)
+            # Mutation (already decided: certain for the problem)
+            mutated = self._problem.mutate(new_individual, 1.0) if mutation else new_individual
+            if index is not None:
+                mutated = self._deduplicated(index, mutated, selected)
+            if timed:
+                now = time.perf_counter()
+                timings['mutation'] += now - clock
+                clock = now
+            if not self._batch_evaluation:
+                nb_evaluations += 1 + mutation
             
             # Add to the new population the individu
-            new_population.append(new_individual)
+            new_population.append(mutated)
+        
+        # Rate the new individuals all at once if the problem allows it
+        if not self._batch_evaluation:
+            # each rejected child was rated by crossover and mutate
+            nb_evaluations += self._nb_duplicates * (2 if self._deduplicate == 'reject' else 1)
+        nb_evaluations += self._evaluate_pending(new_population, num_selected)
+        self._update_population(new_population, self._fitness[survivors], index)
+        self._generation += 1
+        self._nb_evaluations += nb_evaluations
+        if timed:
+            timings['evaluation'], clock = time.perf_counter() - clock, time.perf_counter()
+        
+        # Local search on the best individuals (memetic algorithm)
+        if self._local_search_fraction > 0:
+            self._apply_local_search()
+            if timed:
+                timings['local_search'] = time.perf_counter() - clock
+        if self._checkpoint_file is not None and \
+                self._generation % self._checkpoint_interval == 0:
+            self.save_checkpoint()
+        if timed:
+            self._notify_observers(timings, nb_evaluations, time.perf_counter() - start)
+
+    def _deduplicated(self, index, individual, selected=None):
+        """Gives the individual, or the one replacing it if it duplicates an
+        individual of the index (see the deduplicate argument), and indexes
+        the result
+
+        Args:
+            index (ChromosomeIndex): index of the new population so far
+            individual (Individual): the new individual
+            selected (Sequence, optional): parents of the generation. Defaults
+                to None (initial population: duplicates are always replaced
+                by new random individuals).
+        """
+        key = index.key(individual.chromosome)
+        for _ in range(self._duplicate_attempts):
+            if key not in index:
+                break
+            self._nb_duplicates += 1
+            if self._deduplicate == 'replace' or selected is None:
+                individual = self._problem.create_individual()
+            else:
+                parents = self._problem.select_parents(selected)
+                individual = self._problem.mutate(self._problem.crossover(parents), 1.0)
+            key = index.key(individual.chromosome)
+        index.append(key)
+        return individual
+
+    def _apply_local_search(self):
+        """Improves the best local_search_fraction of the population with
+        problem.improve, best first, within the time budget"""
+        count = int(len(self._population) * self._local_search_fraction)
+        if count <= 0:
+            return
+        fitness = self._fitness
+        best = np.argpartition(-fitness, count - 1)[:count]
+        best = best[np.argsort(-fitness[best])]
+        deadline = None
+        if self._local_search_time is not None:
+            deadline = time.perf_counter() + self._local_search_time
+        for i in best.tolist():
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            individual = self._population[i]
+            improved = self._problem.improve(individual, self._local_search_moves, deadline)
+            if improved is individual:
+                continue
+            self._population[i] = improved
+            fitness[i] = improved.fitness
+            if self._index is not None:
+                self._index.replace(i, self._index.key(improved.chromosome))
+            if self._best.fitness < improved.fitness:
+                self._best = improved
+
+    def _select_survivors(self, num_selected):
+        """Chooses the survivors of the generation with the selection strategy
+
+        Returns:
+            numpy.ndarray: the indices of the survivors in the population
+        """
+        fitness = self._fitness
+        if num_selected <= 0:
+            return np.empty(0, dtype=np.intp)
+        if num_selected >= len(fitness):
+            return np.arange(len(fitness))
+        if self._selection == 'truncation':
+            # partial selection of the num_selected best: O(n), no full sort
+            return np.argpartition(-fitness, num_selected - 1)[:num_selected]
         
-        self._population = new_population
+        rng = self._rng.generator
+        if self._selection == 'tournament':
+            contenders = rng.integers(len(fitness), size=(num_selected, self._tournament_size))
+            winners = np.argmax(fitness[contenders], axis=1)
+            survivors = contenders[np.arange(num_selected), winners]
+        else:
+            weights = fitness - fitness.min()
+            total = weights.sum()
+            p = weights / total if total > 0 else None
+            survivors = rng.choice(len(fitness), size=num_selected, p=p)
+        # elitism: the best individual always survives
+        survivors[0] = np.argmax(fitness)
+        return survivors
+
+    def _update_population(self, population, survivors_fitness, index=None):
+        """Installs a new generation made of survivors of the previous one
+        (whose fitness values are given) followed by the new individuals,
+        with its ChromosomeIndex when deduplicating (built here if not
+        given)"""
+        if self._deduplicate is not None and index is None:
+            index = ChromosomeIndex(self._problem, (indiv.chromosome for indiv in population))
+        self._index = index
+        num_survivors = len(survivors_fitness)
+        if self._array_storage:
+            fitness = population.fitness
+        else:
+            children_fitness = np.fromiter(
+                (indiv.fitness for indiv in population[num_survivors:]),
+                dtype=float, count=len(population) - num_survivors)
+            fitness = np.concatenate((survivors_fitness, children_fitness))
+        self._population = population
+        self._fitness = fitness
+        if len(population) > num_survivors:
+            # the previous best survives, only the children can beat it
+            best_child = num_survivors + int(np.argmax(fitness[num_survivors:]))
+            if self._best is None or self._best.fitness < fitness[best_child]:
+                self._best = population[best_child]
+
+    def add_observer(self, observer):
+        """Attaches an observer, whose on_generation(solver, stats) method is
+        called after every generation with a dict holding:
+        - generation, population_size, best, mean and worst fitness
+        - diversity (see population_diversity)
+        - duplicates: number of duplicated new individuals rejected or
+          replaced (see the deduplicate argument)
+        - evaluations: number of fitness computations of the generation
+        - duration and timings: seconds spent in the generation and in each
+          phase (survivors, selection, crossover, mutation, evaluation; without
+          batch evaluation, rating is part of crossover and mutation; with
+          worker processes, selection, crossover and mutation are 'breeding')
+
+        Without observers, the generations are not timed at all.
+        """
+        self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        """Detaches an observer added by add_observer"""
+        self._observers.remove(observer)
+
+    def _notify_observers(self, timings, nb_evaluations, duration):
+        """Computes the statistics of the generation and sends them to the
+        observers"""
+        fitness = self._fitness
+        stats = {
+            'generation': self._generation,
+            'population_size': len(fitness),
+            'best': self._best.fitness,
+            'mean': fitness.mean().item(),
+            'worst': fitness.min().item(),
+            'diversity': self.population_diversity(),
+            'duplicates': self._nb_duplicates,
+            'evaluations': nb_evaluations,
+            'duration': duration,
+            'timings': {phase: t for phase, t in timings.items() if t or phase != 'breeding'},
+        }
+        for observer in self._observers:
+            observer.on_generation(self, stats)
+
+    def population_diversity(self):
+        """ Fraction of distinct chromosomes in the population (1.0 when all
+        the individuals differ); with deduplicate, read from the index
+        (distinct canonical forms) instead of comparing the chromosomes """
+        if not self._population:
+            return 0.0
+        if self._index is not None:
+            return self._index.nb_distinct() / len(self._index)
+        if self._array_storage:
+            nb_distinct = len(np.unique(self._population.chromosomes, axis=0))
+        else:
+            nb_distinct = len({tuple(indiv.chromosome) for indiv in self._population})
+        return nb_distinct / len(self._population)
     
 
     def show_generation_summary(self):
         """ Print some debug information on the current state of the population """
         best_individual = self.get_best_individual()  # to obtain the best individu
-        worst_individual = min(self._population, key=lambda ind: ind.fitness)  # to obtain the worst individu
+        worst_individual = self._population[int(np.argmin(self._fitness))]  # to obtain the worst individu
 
         
         print(f" Current Generation Summary")
@@ -162,28 +1162,257 @@ class GASolver:
         print(f" Worst Individual: {worst_individual}")
         
 
+    def get_population(self):
+        """ Return the list of the individuals of the current generation """
+        return self._population
+
+    def set_population(self, population):
+        """ Replace the current generation by a list of (rated) individuals """
+        new_population = self._empty_population()
+        for indiv in population:
+            new_population.append(indiv)
+        self._best = None
+        self._update_population(new_population, np.empty(0))
+
     def get_best_individual(self):
         """ Return the best Individual of the population """
         if not self._population:  # Vérify if the population is not empty
             print(" La population est vide !")
             return None
-        return max(self._population, key=lambda indiv: indiv.fitness)
+        return self._best
+
+    def get_problem(self):
+        """ Return the GAProblem solved """
+        return self._problem
+
+    def get_generation(self):
+        """ Return the number of generations since reset_population """
+        return self._generation
+
+    def get_evaluation_count(self):
+        """ Return the number of fitness computations since reset_population
+        (counted as in the observer statistics) """
+        return self._nb_evaluations
+
+    def get_rates(self):
+        """ Return the current (selection_rate, mutation_rate) """
+        return self._selection_rate, self._mutation_rate
+
+    def set_rates(self, selection_rate=None, mutation_rate=None):
+        """ Change the selection and/or mutation rate for the next
+        generations (see ga_control.DiversityControl) """
+        if selection_rate is not None:
+            self._selection_rate = selection_rate
+        if mutation_rate is not None:
+            self._mutation_rate = mutation_rate
     
     
 
-    def evolve_until(self, max_nb_of_generations=500, threshold_fitness=None):
+    # Solver parameters saved in the checkpoints and restored on resume
+    CHECKPOINT_PARAMETERS = ('selection_rate', 'mutation_rate', 'population_size',
+                             'selection', 'tournament_size', 'local_search_fraction',
+                             'local_search_time', 'local_search_moves')
+
+    def _snapshot(self):
+        """State of the run as a dict of plain values and arrays, copied so
+        that the run can go on while it is written"""
+        if self._array_storage:
+            chromosomes = self._population.chromosomes.copy()
+        else:
+            chromosomes = [indiv.chromosome for indiv in self._population]
+            encoded = np.array([self._problem.encode_chromosome(c) for c in chromosomes])
+            if encoded.ndim == 2 and encoded.dtype.kind in 'iufb':
+                # compact form, decoded again on resume
+                chromosomes = encoded
+            else:
+                chromosomes = [list(c) if isinstance(c, list) else c for c in chromosomes]
+        best = self._best
+        return {
+            'version': 3,
+            'generation': self._generation,
+            'evaluations': self._nb_evaluations,
+            'run_start': self._run_start,
+            'parameters': {name: getattr(self, '_' + name)
+                           for name in self.CHECKPOINT_PARAMETERS},
+            'random_state': (self._rng.getstate(), self._problem.rng.getstate()),
+            'chromosomes': chromosomes,
+            'fitness': self._fitness.copy(),
+            'best': None if best is None else (best.chromosome, best.fitness),
+            'run_state': self._run_state(),
+        }
+
+    def _run_state(self):
+        """States of the stopping policies and rate controller of the
+        current evolve_until run, or None outside a run"""
+        if self._stopping is None:
+            return None
+        controller = self._controller
+        return ([policy.get_state() for policy in self._stopping],
+                None if controller is None else controller.get_state())
+
+    def save_checkpoint(self, filename=None):
+        """Writes the state of the run (population, generation counter,
+        states of the solver and problem random streams and parameters) to
+        a binary file
+
+        The state is copied right away and written by a background thread,
+        so the generations go on meanwhile; the file is replaced atomically
+        once complete. A checkpoint waits for the previous one to be
+        written.
+
+        Args:
+            filename (str, optional): Defaults to the checkpoint_file given
+                to the constructor.
+        """
+        filename = filename or self._checkpoint_file
+        if filename is None:
+            raise ValueError("No checkpoint file given")
+        snapshot = self._snapshot()
+        self.wait_for_checkpoint()
+        if self._checkpoint_writer is None:
+            self._checkpoint_writer = ThreadPoolExecutor(max_workers=1)
+        self._checkpoint_pending = self._checkpoint_writer.submit(
+            _write_checkpoint, snapshot, filename)
+
+    def wait_for_checkpoint(self):
+        """Blocks until the checkpoint being written (if any) is on disk,
+        and raises the error that interrupted its writing (if any)"""
+        if self._checkpoint_pending is not None:
+            pending, self._checkpoint_pending = self._checkpoint_pending, None
+            pending.result()
+
+    def load_checkpoint(self, filename=None):
+        """Restores the state of the run written by save_checkpoint: the
+        run then continues exactly as it would have from that generation
+
+        Args:
+            filename (str, optional): Defaults to the checkpoint_file given
+                to the constructor.
+        """
+        filename = filename or self._checkpoint_file
+        self.wait_for_checkpoint()
+        with open(filename, 'rb') as file:
+            snapshot = pickle.load(file)
+        for name, value in snapshot['parameters'].items():
+            setattr(self, '_' + name, value)
+        chromosomes = snapshot['chromosomes']
+        if isinstance(chromosomes, np.ndarray):
+            chromosomes = [self._problem.decode_chromosome(c) for c in chromosomes]
+        population = self._empty_population()
+        for chromosome, fitness in zip(chromosomes, snapshot['fitness'].tolist()):
+            population.append(Individual(chromosome, fitness))
+        self._best = None
+        self._update_population(population, np.empty(0))
+        if snapshot['best'] is not None:
+            self._best = Individual(*snapshot['best'])
+        self._generation = snapshot['generation']
+        self._nb_evaluations = snapshot['evaluations']
+        self._run_start = snapshot['run_start']
+        self._resumed_run_state = snapshot.get('run_state')
+        solver_state, problem_state = snapshot['random_state']
+        self._rng.setstate(solver_state)
+        self._problem.rng.setstate(problem_state)
+
+    def evolve_until(self, max_nb_of_generations=500, threshold_fitness=None, resume=False,
+                     stopping=None, controller=None):
         """ Launch the evolve_for_one_generation function until one of the two condition is achieved : 
             - Max nb of generation is achieved
             - The fitness of the best Individual is greater than or equal to
               threshold_fitness
+            - One of the stopping policies asks to stop
+
+            With resume=True and an existing checkpoint_file, the run
+            restarts from the last checkpoint (see load_checkpoint) and
+            gives the same result as if it had never been interrupted, as
+            long as it is given the same stopping policies and controller
+            (their states are in the checkpoint).
+
+            Args:
+                stopping (list[ga_control.StoppingPolicy], optional): Defaults
+                    to None (stop when problem.is_solution_found says so).
+                controller (ga_control.RateController, optional): adapts the
+                    rates after each generation. Defaults to None (constant
+                    rates).
+
+            Returns:
+                str: why the run stopped
         """
-        for generation in range(max_nb_of_generations):
-            
-            self.evolve_for_one_generation()
-            best_individual = self.get_best_individual()  # find the best guy
-            if best_individual is None:  # if the population is empty we stop the loop
-                print(" Arrêt prématuré : La population est vide.")
+        stopping, stop = self._start_run(resume, stopping, controller, threshold_fitness)
+        for generation in range(self._generation - self._run_start, max_nb_of_generations):
+            if stop is not None:
                 break
-            if threshold_fitness is not None and best_individual.fitness >= threshold_fitness:
-                print(f"Stopping at generation {generation} - Best fitness reached: {best_individual.fitness}")
-                break  # we stop the loop is the threshold is reached Arrête 
+            self.evolve_for_one_generation()
+            stop = self._end_of_generation(generation, threshold_fitness, stopping, controller)
+        self._end_run()
+        return "maximum number of generations reached" if stop is None else stop
+
+    def _start_run(self, resume, stopping, controller, threshold_fitness):
+        """Prepares a run of evolve_until (see its arguments)
+
+        When the run resumes from a checkpoint taken during evolve_until,
+        the stopping policies and the controller get back their states of
+        the checkpoint, and the end of its generation (rates update and
+        stopping checks, which came after the checkpoint) is replayed.
+
+        Returns:
+            tuple: the stopping policies of the run, and why it must stop
+            right away (or None)
+        """
+        self._resumed_run_state = None
+        if resume and self._checkpoint_file is not None and \
+                os.path.exists(self._checkpoint_file):
+            self.load_checkpoint()
+        if not resume or self._run_start is None:
+            self._run_start = self._generation
+        if stopping is None:
+            stopping = [ga_control.SolutionFound()]
+        run_state = self._resumed_run_state
+        if run_state is not None and (len(run_state[0]) != len(stopping) or
+                                      (run_state[1] is None) != (controller is None)):
+            run_state = None  # not the same policies: start them again
+        if run_state is None:
+            for policy in stopping:
+                policy.reset(self)
+            if controller is not None:
+                controller.reset(self)
+        else:
+            for policy, state in zip(stopping, run_state[0]):
+                policy.set_state(state)
+            if controller is not None:
+                controller.set_state(run_state[1])
+        self._stopping, self._controller = stopping, controller
+        if run_state is None:
+            return stopping, None
+        return stopping, self._end_of_generation(self._generation - self._run_start - 1,
+                                                 threshold_fitness, stopping, controller)
+
+    def _end_of_generation(self, generation, threshold_fitness, stopping, controller):
+        """Adapts the rates and checks the stopping conditions after a
+        generation of evolve_until
+
+        Returns:
+            str: why the run must stop, or None to go on
+        """
+        best_individual = self.get_best_individual()  # find the best guy
+        if best_individual is None:  # if the population is empty we stop the loop
+            print(" Arrêt prématuré : La population est vide.")
+            return "empty population"
+        if threshold_fitness is not None and best_individual.fitness >= threshold_fitness:
+            print(f"Stopping at generation {generation} - Best fitness reached: {best_individual.fitness}")
+            return "threshold fitness reached"  # we stop the loop is the threshold is reached
+        if controller is not None:
+            controller.update(self, generation)
+        for policy in stopping:
+            stop = policy.check(self, generation)
+            if stop is not None:
+                return stop
+        return None
+
+    def _end_run(self):
+        """Ends a run of evolve_until"""
+        if self._controller is not None:
+            self._controller.finish(self)
+        self._run_start = None
+        self._stopping = self._controller = None
+        if self._checkpoint_file is not None:
+            self.wait_for_checkpoint()
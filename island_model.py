@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Island model on top of the generic genetic algorithm module
+
+Several GASolver populations (the islands) evolve independently in
+separate processes and periodically exchange their best individuals
+(migration), which keeps the search diverse on large problems.
+"""
+import time
+
+import ga_solver
+from ga_solver import GAProblem, GASolver, random_stream
+
+
+def _evolve_island(problem, solver_options, population, nb_generations, rng):
+    """Evolves one island for some generations, drawing from substreams of
+    the island's RandomStream
+
+    Returns:
+        list[Individual]: the population of the island afterwards
+    """
+    problem.rng, solver_rng = rng.spawn(2)
+    solver = GASolver(problem, rng=solver_rng, **solver_options)
+    if population is None:
+        solver.reset_population()
+    else:
+        solver.set_population(population)
+    for _ in range(nb_generations):
+        solver.evolve_for_one_generation()
+    return list(solver.get_population())
+
+
+def _worker_evolve_island(solver_options, population, nb_generations, rng):
+    return _evolve_island(ga_solver._worker_problem, solver_options, population,
+                          nb_generations, rng)
+
+
+class IslandModel:
+    """Runs several GASolver populations in parallel with migrations"""
+
+    TOPOLOGIES = ('ring', 'fully_connected')
+
+    def __init__(self, problem: GAProblem, nb_islands=4, migration_interval=10,
+                 nb_migrants=2, topology='ring', n_workers=None, rng=None,
+                 **solver_options):
+        """Initializes an island model for a given GAProblem
+
+        Args:
+            problem (GAProblem): GAProblem to be solved on every island
+            nb_islands (int, optional): Number of islands. Defaults to 4.
+            migration_interval (int, optional): Number of generations between
+                two migrations. Defaults to 10.
+            nb_migrants (int, optional): Number of best individuals sent by an
+                island to each of its neighbours. Defaults to 2.
+            topology (str, optional): 'ring' (island i sends to island i+1)
+                or 'fully_connected' (every island sends to all the others).
+                Defaults to 'ring'.
+            n_workers (int, optional): Number of worker processes. Defaults to
+                None (one per island); 1 runs the islands in this process.
+            rng (optional): RandomStream or integer seed; every island draws
+                from its own substream of it (see ga_solver.random_stream).
+            solver_options: Other arguments given to the GASolver of each
+                island (selection_rate, mutation_rate, pop_size...).
+        """
+        if topology not in self.TOPOLOGIES:
+            raise ValueError(f"Unknown topology: {topology}")
+        self._problem = problem
+        self._nb_islands = nb_islands
+        self._migration_interval = migration_interval
+        self._nb_migrants = nb_migrants
+        self._topology = topology
+        self._n_workers = n_workers or nb_islands
+        self._solver_options = solver_options
+        self._rng = random_stream(rng)
+        self._islands = [None] * nb_islands
+        self._generation = 0
+        self._executor = None
+        self.history = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shuts down the worker processes (if any)"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _evolve_islands(self, nb_generations):
+        """Evolves every island for some generations, in parallel (the first
+        call also creates the initial populations)"""
+        # one independent stream per island and per epoch, spawned here: the
+        # run does not depend on the number of workers
+        streams = self._rng.spawn(len(self._islands))
+        if self._n_workers == 1:
+            problem_rng = self._problem.rng
+            self._islands = [
+                _evolve_island(self._problem, self._solver_options, population,
+                               nb_generations, stream)
+                for population, stream in zip(self._islands, streams)]
+            self._problem.rng = problem_rng
+            return
+        if self._executor is None:
+            self._executor = ga_solver._worker_pool(self._n_workers, self._problem)
+        futures = [self._executor.submit(_worker_evolve_island, self._solver_options,
+                                         population, nb_generations, stream)
+                   for population, stream in zip(self._islands, streams)]
+        self._islands = [future.result() for future in futures]
+
+    def _neighbours(self, island):
+        """Indices of the islands receiving the migrants of an island"""
+        if self._topology == 'ring':
+            return [(island + 1) % self._nb_islands]
+        return [other for other in range(self._nb_islands) if other != island]
+
+    def migrate(self):
+        """Sends the best individuals of every island to its neighbours,
+        where they replace the worst individuals"""
+        if self._nb_islands < 2 or self._nb_migrants <= 0:
+            return
+        for population in self._islands:
+            population.sort(reverse=True)
+        incoming = [[] for _ in self._islands]
+        for island, population in enumerate(self._islands):
+            for neighbour in self._neighbours(island):
+                incoming[neighbour].extend(population[:self._nb_migrants])
+        for population, migrants in zip(self._islands, incoming):
+            # never replace more than half of an island
+            migrants = sorted(migrants, reverse=True)[:len(population) // 2]
+            if migrants:
+                population[-len(migrants):] = migrants
+
+    def island_best_individuals(self):
+        """ Return the best Individual of every island """
+        return [max(population) for population in self._islands]
+
+    def get_best_individual(self):
+        """ Return the best Individual over all the islands """
+        return max(self.island_best_individuals())
+
+    def evolve_until(self, max_nb_of_generations=500, threshold_fitness=None):
+        """ Evolve the islands, migrating every migration_interval generations,
+        until max_nb_of_generations is achieved or the best fitness is greater
+        than or equal to threshold_fitness
+
+        Returns:
+            list[dict]: one record per migration epoch (also appended to
+            self.history) with the generation, the elapsed wall-clock time,
+            the best fitness of every island and the global best fitness
+        """
+        start = time.perf_counter()
+        remaining = max_nb_of_generations
+        while remaining > 0:
+            nb_generations = min(self._migration_interval, remaining)
+            self._evolve_islands(nb_generations)
+            remaining -= nb_generations
+            self._generation += nb_generations
+
+            island_best = [indiv.fitness for indiv in self.island_best_individuals()]
+            self.history.append({
+                'generation': self._generation,
+                'elapsed': time.perf_counter() - start,
+                'island_best': island_best,
+                'global_best': max(island_best),
+            })
+            if threshold_fitness is not None and max(island_best) >= threshold_fitness:
+                print(f"Stopping at generation {self._generation} - Best fitness reached: {max(island_best)}")
+                break
+            self.migrate()
+        return self.history
+
+
+if __name__ == '__main__':
+    import cities
+    from tsp_problem import TSProblem
+
+    city_dict = cities.load_cities("cities.txt")
+    problem = TSProblem(city_dict)
+    with IslandModel(problem, nb_islands=4, pop_size=50) as model:
+        for record in model.evolve_until(max_nb_of_generations=200):
+            print(record['generation'], record['island_best'], record['global_best'])
+        print(problem.decode(model.get_best_individual().chromosome))
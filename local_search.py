@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Local search for the traveling salesperson problem
+
+Improves a road with 2-opt moves (reversing a section) and Or-opt moves
+(moving a section of 1 to 3 cities elsewhere). Only moves creating an edge
+to one of the k nearest neighbours of a city are tried, and cities whose
+neighbourhood brought no improvement are skipped until one of their edges
+changes (don't-look bits). Every move is evaluated by the variation of the
+few edges it changes.
+"""
+from collections import deque
+import time
+
+
+class LocalSearch:
+    """2-opt and Or-opt local search with neighbour lists"""
+
+    # Improvements smaller than this are ignored (rounding errors)
+    EPSILON = 1e-9
+
+    def __init__(self, distances, neighbours, or_opt_max_length=3):
+        """Initializes the local search
+
+        Args:
+            distances: distance matrix of the cities, or any object giving
+                distances[i, j] (see cities.CoordinateDistances)
+            neighbours (list[list[int]]): nearest cities of every city,
+                nearest first (see cities.SpatialIndex.nearest_neighbours)
+            or_opt_max_length (int, optional): longest section moved by
+                Or-opt. Defaults to 3.
+        """
+        self.distances = distances
+        self.neighbours = neighbours
+        self.or_opt_max_length = or_opt_max_length
+
+    def improve(self, road, max_moves=None, deadline=None):
+        """Improves a road until no move helps or the budget is exhausted
+
+        Args:
+            road (list[int]): the road to improve (left unchanged)
+            max_moves (int, optional): maximum number of improving moves.
+                Defaults to None (no limit).
+            deadline (float, optional): time.perf_counter() value after which
+                the search stops. Defaults to None (no limit).
+
+        Returns:
+            tuple: the improved road and the variation of its length
+            (negative or zero)
+        """
+        road = list(road)
+        n = len(road)
+        if n < 5:
+            return road, 0.0
+        position = [0] * n
+        for i, city in enumerate(road):
+            position[city] = i
+
+        total = 0.0
+        nb_moves = 0
+        active = deque(road)
+        inactive = bytearray(n)
+        while active:
+            if max_moves is not None and nb_moves >= max_moves:
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            city = active.popleft()
+            inactive[city] = 1
+            move = self._two_opt(road, position, city)
+            if move is None:
+                move = self._or_opt(road, position, city)
+                if move is not None:
+                    # the road was rebuilt
+                    for i, c in enumerate(road):
+                        position[c] = i
+            if move is None:
+                continue
+            delta, touched = move
+            total += delta
+            nb_moves += 1
+            for c in touched:
+                if inactive[c]:
+                    inactive[c] = 0
+                    active.append(c)
+            if inactive[city]:
+                inactive[city] = 0
+                active.append(city)
+        return road, total
+
+    def _reverse(self, road, position, i, j):
+        """Reverses the section of the road from position i to position j
+        (cyclically), or the rest of the road when it is shorter (which
+        gives the same loop)"""
+        n = len(road)
+        length = (j - i) % n + 1
+        if 2 * length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        for _ in range(length // 2):
+            road[i], road[j] = road[j], road[i]
+            position[road[i]] = i
+            position[road[j]] = j
+            i = (i + 1) % n
+            j = (j - 1) % n
+
+    def _two_opt(self, road, position, a):
+        """Tries the 2-opt moves adding an edge from a to a neighbour
+
+        Returns:
+            tuple: (variation of the length, cities whose edges changed), or
+            None if no move improves the road
+        """
+        d = self.distances
+        n = len(road)
+        i = position[a]
+        succ_a, pred_a = road[(i + 1) % n], road[i - 1]
+        d_succ, d_pred = d[a, succ_a], d[pred_a, a]
+        for c in self.neighbours[a]:
+            d_ac = d[a, c]
+            if d_ac >= d_succ and d_ac >= d_pred:
+                break  # neighbours are sorted: no further gain possible
+            j = position[c]
+            if d_ac < d_succ:
+                # a-succ_a and c-succ_c become a-c and succ_a-succ_c
+                succ_c = road[(j + 1) % n]
+                if c != succ_a and succ_c != a:
+                    delta = d_ac + d[succ_a, succ_c] - d_succ - d[c, succ_c]
+                    if delta < -self.EPSILON:
+                        self._reverse(road, position, (i + 1) % n, j)
+                        return delta, (a, succ_a, c, succ_c)
+            if d_ac < d_pred:
+                # pred_a-a and pred_c-c become a-c and pred_a-pred_c
+                pred_c = road[j - 1]
+                if c != pred_a and pred_c != a:
+                    delta = d_ac + d[pred_a, pred_c] - d_pred - d[pred_c, c]
+                    if delta < -self.EPSILON:
+                        self._reverse(road, position, i, (j - 1) % n)
+                        return delta, (a, pred_a, c, pred_c)
+        return None
+
+    def _or_opt(self, road, position, a):
+        """Tries to move a section starting at a (going forward) next to one
+        of a's neighbours
+
+        Returns:
+            tuple: (variation of the length, cities whose edges changed), or
+            None if no move improves the road
+        """
+        d = self.distances
+        n = len(road)
+        i = position[a]
+        for length in range(1, min(self.or_opt_max_length, n - 3) + 1):
+            section = [road[(i + k) % n] for k in range(length)]
+            prev, nxt = road[i - 1], road[(i + length) % n]
+            last = section[-1]
+            removal = d[prev, nxt] - d[prev, a] - d[last, nxt]
+            if removal >= -self.EPSILON:
+                continue
+            for c in self.neighbours[a]:
+                j = position[c]
+                if (j - i) % n < length:
+                    continue  # c is in the section
+                # insert between c and one of its neighbours on the road,
+                # with a next to c
+                for x, y, first, end in ((road[j - 1], c, last, a),
+                                         (c, road[(j + 1) % n], a, last)):
+                    if x in section or y in section:
+                        continue
+                    delta = removal + d[x, first] + d[end, y] - d[x, y]
+                    if delta < -self.EPSILON:
+                        self._move_section(road, i, length, x, first == a)
+                        return delta, (prev, nxt, x, y, a, last)
+        return None
+
+    def _move_section(self, road, i, length, after, forward):
+        """Moves the section of the road starting at position i after the
+        city `after`, in the same direction if forward"""
+        n = len(road)
+        # rotate the road so that the section ends it, then cut it out
+        start = (i + length) % n
+        rotated = road[start:] + road[:start]
+        rest, section = rotated[:n - length], rotated[n - length:]
+        if not forward:
+            section.reverse()
+        k = rest.index(after) + 1
+        road[:] = rest[:k] + section + rest[k:]
@@ -11,22 +11,30 @@ a match of the game having a certain secret code generated at random.
 This class plays the role of the codemaker, allowing to check if a guess
 is correct and rating how close a guess is to the secret code.
 """
-from random import choice
+import random
 from typing import List
+import numpy as np
 
 # Possible colors for codes in in the game
 _colors = ['blue', 'red', 'green', 'yellow', 'orange', 'violet']
 _colors_to_int = dict([(c, i) for i, c in enumerate(_colors)])
 
+# Packed guesses (see pack_guesses): each peg takes _peg_bits bits of an
+# unsigned 64 bits word
+_peg_bits = max(1, (len(_colors) - 1).bit_length())
+_pegs_per_word = 64 // _peg_bits
+_peg_shifts = np.arange(_pegs_per_word, dtype=np.uint64) * np.uint64(_peg_bits)
+
 
 def get_possible_colors():
     """Getter function to read the array of possible colors"""
     return _colors
 
 
-def generate_random_secret(size) -> List[str]:
-    """Generate a random secret of a given size"""
-    secret = [choice(_colors) for _ in range(size)]
+def generate_random_secret(size, rng=random) -> List[str]:
+    """Generate a random secret of a given size (drawn from rng, a
+    random.Random instance or the random module)"""
+    secret = [rng.choice(_colors) for _ in range(size)]
     return secret
 
 
@@ -40,7 +48,8 @@ class MastermindMatch:
     def __init__(self,
                  secret_size=4,
                  correct_color_points=1,
-                 correct_position_points=3):
+                 correct_position_points=3,
+                 rng=random):
         """Instantiates a mastermind guess with a random secret code
 
         A match can be created by calling:
@@ -53,10 +62,30 @@ class MastermindMatch:
             color at the wrong position. Defaults to 1.
             correct_position_points (int, optional): points awarded for a
             correct color at the right position. Defaults to 3.
+            rng (random.Random, optional): generator of the secret (and of
+            the random guesses). Defaults to the random module.
         """
-        self._secret = generate_random_secret(secret_size)
+        self._rng = rng
+        self._secret = generate_random_secret(secret_size, rng)
         self.correct_color_points = correct_color_points
         self.correct_position_points = correct_position_points
+        self._build_tables()
+
+    def _build_tables(self):
+        """Precomputes the packed secret and its color counts, used to rate
+        packed guesses"""
+        secret = np.array(encode_guess(self._secret))
+        self._color_counts = np.bincount(secret, minlength=len(_colors))
+        self._packed_secret = pack_guesses(secret[None])[0]
+        self._peg_mask = _peg_mask(len(secret))
+        # packed guesses of a single color, for the colors of the secret or
+        # for the other ones, whichever are fewer (large secrets often use
+        # every color: no pattern at all is needed then)
+        present = self._color_counts > 0
+        self._count_absent_colors = 2 * present.sum() > len(_colors)
+        pattern_colors = np.flatnonzero(~present if self._count_absent_colors else present)
+        self._color_patterns = pack_guesses(
+            np.repeat(pattern_colors[:, None], len(secret), axis=1))
 
     def is_correct(self, guess: List[str]) -> bool:
         """Checks whether a guess matches the secret code
@@ -69,8 +98,14 @@ class MastermindMatch:
         """
         return guess == self._secret
 
-    def generate_random_guess(self):
-        return generate_random_secret(len(self._secret))
+    def generate_random_guess(self, rng=None):
+        """Random guess of the size of the secret
+
+        Args:
+            rng (random.Random, optional): generator of the guess. Defaults
+            to the generator of the secret.
+        """
+        return generate_random_secret(len(self._secret), self._rng if rng is None else rng)
 
     def rate_guess(self, guess: List[str]):
         """Gives a numeric score for a given guess proportional to how close
@@ -93,6 +128,47 @@ class MastermindMatch:
             correct_position * self.correct_position_points
         return score
 
+    def rate_guesses(self, guesses) -> np.ndarray:
+        """Vectorized version of rate_guess, scoring many guesses at once
+
+        Args:
+            guesses (numpy.ndarray): 2D array with one guess per row, either
+            as color strings or as color indices (see encode_guess)
+
+        Returns:
+            numpy.ndarray: the score of each guess
+        """
+        guesses = np.asarray(guesses)
+        if guesses.dtype.kind in 'US':
+            guesses = encode_guesses(guesses)
+        return self.rate_packed_guesses(pack_guesses(guesses))
+
+    def rate_packed_guesses(self, packed) -> np.ndarray:
+        """Scores many guesses packed by pack_guesses
+
+        A peg at the right position is a peg equal to the secret's one; the
+        pegs of a color of the secret are counted through the pegs equal to
+        one of the colors of the secret (or to none of the other colors).
+        Both are counted on whole words at once, so the cost does not depend
+        on the secret size beyond the number of words.
+
+        Args:
+            packed (numpy.ndarray): 2D array of packed guesses (one per row)
+
+        Returns:
+            numpy.ndarray: the score of each guess
+        """
+        correct_position = _count_equal_pegs(packed, self._packed_secret, self._peg_mask)
+        pattern_pegs = sum(_count_equal_pegs(packed, pattern, self._peg_mask)
+                           for pattern in self._color_patterns)
+        if self._count_absent_colors:
+            secret_colors = len(self._secret) - pattern_pegs
+        else:
+            secret_colors = pattern_pegs
+        correct_colors = secret_colors - correct_position
+        return correct_colors*self.correct_color_points + \
+            correct_position*self.correct_position_points
+
     def secret_size(self):
         """Returns the size of the secret code"""
         return len(self._secret)
@@ -114,3 +190,92 @@ def encode_guess(guess: List[str]) -> List[int]:
         list[int]: a mastermind guess as a list of integers
     """
     return [_colors_to_int[c] for c in guess]
+
+
+def decode_guess(encoded) -> List[str]:
+    """Decode a guess encoded by encode_guess back into color strings
+
+    Args:
+        encoded (list[int]): a mastermind guess as a list of integers
+
+    Returns:
+        list[str]: a mastermind guess as a list of color strings
+    """
+    return [_colors[i] for i in encoded]
+
+
+def encode_guesses(guesses) -> np.ndarray:
+    """Encode an array of guesses (color strings) into an array of the same
+    shape holding the color indices
+
+    Args:
+        guesses (numpy.ndarray): array of color strings
+
+    Returns:
+        numpy.ndarray: array of integers
+    """
+    guesses = np.asarray(guesses)
+    encoded = np.zeros(guesses.shape, dtype=np.int64)
+    for i, c in enumerate(_colors):
+        encoded[guesses == c] = i
+    return encoded
+
+
+def pack_guesses(guesses) -> np.ndarray:
+    """Pack encoded guesses into unsigned 64 bits words, _pegs_per_word pegs
+    per word (peg k of a word in bits k*_peg_bits and up)
+
+    Args:
+        guesses (numpy.ndarray): 2D array of color indices (see encode_guess),
+        one guess per row
+
+    Returns:
+        numpy.ndarray: 2D array of numpy.uint64, one packed guess per row
+    """
+    guesses = np.asarray(guesses, dtype=np.uint64)
+    nb_guesses, size = guesses.shape
+    nb_words = -(-size // _pegs_per_word)
+    padded = np.zeros((nb_guesses, nb_words * _pegs_per_word), dtype=np.uint64)
+    padded[:, :size] = guesses
+    pegs = padded.reshape(nb_guesses, nb_words, _pegs_per_word) << _peg_shifts
+    return np.bitwise_or.reduce(pegs, axis=2)
+
+
+def unpack_guesses(packed, size) -> np.ndarray:
+    """Inverse of pack_guesses
+
+    Args:
+        packed (numpy.ndarray): 2D array of packed guesses
+        size (int): number of pegs of the guesses
+
+    Returns:
+        numpy.ndarray: 2D array of color indices, one guess per row
+    """
+    packed = np.asarray(packed, dtype=np.uint64)
+    pegs = (packed[:, :, None] >> _peg_shifts) & np.uint64((1 << _peg_bits) - 1)
+    return pegs.reshape(len(packed), -1)[:, :size].astype(np.int64)
+
+
+def _peg_mask(size) -> np.ndarray:
+    """Words with the lowest bit of every used peg set, for packed guesses
+    of the given size"""
+    return pack_guesses(np.ones((1, size), dtype=np.uint64))[0]
+
+
+def _popcount(words) -> np.ndarray:
+    """Number of bits set in each unsigned 64 bits word"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words)
+    bytes_ = words.view(np.uint8).reshape(words.shape + (8,))
+    return np.unpackbits(bytes_, axis=-1).sum(axis=-1)
+
+
+def _count_equal_pegs(packed, pattern, peg_mask) -> np.ndarray:
+    """Number of pegs of each packed guess equal to those of pattern"""
+    different = packed ^ pattern
+    # gather on the lowest bit of each peg whether any of its bits differ
+    folded = different
+    for shift in range(1, _peg_bits):
+        folded = folded | (different >> np.uint64(shift))
+    nb_different = _popcount(folded & peg_mask).sum(axis=1)
+    return _popcount(peg_mask).sum() - nb_different
@@ -6,24 +6,30 @@ Created on Thu Feb 18 2022
 Template file for your Exercise 3 submission 
 (GA solving Mastermind example)
 """
-from ga_solver import GAProblem, Individual
+from ga_solver import FitnessCache, GAProblem, Individual, random_stream
 import mastermind as mm
-import random
 
 
 class MastermindProblem(GAProblem):
     """GAProblem Implementation for the Mastermind Problem"""
     
-    def __init__(self, secret_size=4, target_fitness=None):
+    def __init__(self, secret_size=4, target_fitness=None, cache_size=4096, rng=None):
         """Initializes the Mastermind problem
 
             Args:
             secret_size (int): secret code size
             target_fitness (float): target fitness (if None, use the maximum possible value))
+            cache_size (int): number of guess ratings kept in fitness_cache
+                for rate (0 or None to rate every guess again); evaluate_batch
+                does not use it
+            rng: RandomStream or integer seed of the random draws, secret
+                included (see ga_solver.random_stream)
         """
         self.secret_size = secret_size
-        self.match = mm.MastermindMatch(secret_size=secret_size)
+        self.rng = random_stream(rng)
+        self.match = mm.MastermindMatch(secret_size=secret_size, rng=self.rng)
         self.valid_colors = mm.get_possible_colors()
+        self.fitness_cache = FitnessCache(cache_size) if cache_size else None
         
         
         if target_fitness is None:
@@ -31,54 +37,74 @@ class MastermindProblem(GAProblem):
         else:
             self.target_fitness = target_fitness
     
+    def rate(self, guess):
+        """Rates a guess against the secret (remembered in fitness_cache)"""
+        return self.cached_fitness(guess, self.match.rate_guess)
+    
     def create_individual(self):
         """Creates an individual with a random combination of colors"""
         
-        chromosome = [random.choice(self.valid_colors) for _ in range(self.secret_size)]
+        chromosome = [self.rng.choice(self.valid_colors) for _ in range(self.secret_size)]
         
         
-        fitness = self.match.rate_guess(chromosome)
+        fitness = None if self.defer_evaluation else self.rate(chromosome)
         
         return Individual(chromosome, fitness)
     
     def select_parents(self, population):
         """Selects two parents for breeding"""
-        return random.sample(population, 2)
+        return self.rng.sample(population, 2)
     
     def crossover(self, parents):
         """Cross two parents to create a child"""
         parent_a, parent_b = parents[0].chromosome, parents[1].chromosome
         
         
-        x_point = random.randint(1, self.secret_size - 1)
+        x_point = self.rng.randint(1, self.secret_size - 1)
         
         # Creation of newchild by crossing 
         new_chrom = parent_a[:x_point] + parent_b[x_point:]
         
         # Calcululation of fitness
-        fitness = self.match.rate_guess(new_chrom)
+        fitness = None if self.defer_evaluation else self.rate(new_chrom)
         
         return Individual(new_chrom, fitness)
     
     def mutate(self, individual, mutation_rate):
         """Applies a mutation by changing a random color with a certain probability"""
-        if random.random() >= mutation_rate:
+        if self.rng.random() >= mutation_rate:
             return individual  # no mutation
         
         # Copy of  chromosome
         mutated_chrom = individual.chromosome.copy()
         
         # Selection of a random  position 
-        pos = random.randint(0, self.secret_size - 1)
+        pos = self.rng.randint(0, self.secret_size - 1)
         
         # Changing color
-        mutated_chrom[pos] = random.choice(self.valid_colors)
+        mutated_chrom[pos] = self.rng.choice(self.valid_colors)
         
         # Calculation of the new fitness
-        fitness = self.match.rate_guess(mutated_chrom)
+        fitness = None if self.defer_evaluation else self.rate(mutated_chrom)
         
         return Individual(mutated_chrom, fitness)
     
+    def encode_chromosome(self, chromosome):
+        """Encodes a guess as color indices"""
+        return mm.encode_guess(chromosome)
+    
+    def decode_chromosome(self, encoded):
+        """Decodes color indices back into a guess"""
+        return mm.decode_guess(encoded.tolist())
+    
+    def evaluate_batch(self, chromosomes):
+        """Rates a 2D array of encoded guesses at once (one guess per row)
+
+        Not cached: scoring the packed words costs less than looking each
+        row up, and the rows would not share the keys of rate anyway.
+        """
+        return self.match.rate_guesses(chromosomes)
+    
     def is_solution_found(self, best_individual, generation):
         """Determines whether a satisfactory solution has been found"""
         
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Exhaustive Mastermind solver for small secret sizes
+
+The whole candidate space (every possible secret) is held in a compact
+integer array. After each guess, the candidates that would not have given
+the score returned by the MastermindMatch are discarded, and the next guess
+is the consistent candidate that splits the remaining ones best (minimax or
+entropy criterion). Each guess removes at least itself from the consistent
+set, so a match always ends. The number of guesses needed for every secret
+is computed by ConsistentSetSolver.guess_counts; with the default settings
+and point schedule, the worst cases over the whole space are:
+
+    pegs    minimax (mean)    entropy (mean)
+    2       6 (3.72)          6 (3.72)
+    3       7 (4.26)          6 (4.11)
+    4       7 (4.71)          7 (4.52)
+
+(the score of a guess does not tell apart every feedback: 3 right colors
+score as much as 1 right position, hence more guesses than in the classic
+game).
+
+solve() uses this solver when the candidate space is small enough and falls
+back to the genetic algorithm otherwise.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from ga_solver import GASolver, random_stream
+import mastermind as mm
+
+
+class CandidateSpace:
+    """Every possible secret of a given size, as color indices"""
+
+    def __init__(self, secret_size):
+        """Materializes the candidate space
+
+        Args:
+            secret_size (int): number of pegs of the secrets
+        """
+        nb_colors = len(mm.get_possible_colors())
+        self.secret_size = secret_size
+        indices = np.arange(nb_colors ** secret_size)
+        powers = nb_colors ** np.arange(secret_size - 1, -1, -1)
+        # one candidate per row, in lexicographic order
+        self.codes = ((indices[:, None] // powers) % nb_colors).astype(np.uint8)
+        # bit c of color_sets[i] is set if candidate i uses color c
+        self.color_sets = np.bitwise_or.reduce(
+            np.left_shift(1, self.codes.astype(np.uint16)), axis=1).astype(np.uint16)
+        self._table = None
+        self._table_points = None
+
+    @classmethod
+    def from_arrays(cls, codes, color_sets, feedback_table=None, points=None):
+        """Candidate space over arrays already computed by another one (held
+        in shared memory for instance, see batch_solver)
+
+        Args:
+            codes, color_sets (numpy.ndarray): the arrays of a CandidateSpace
+            feedback_table (numpy.ndarray, optional): its feedback table
+            points (tuple, optional): point schedule of feedback_table
+        """
+        space = cls.__new__(cls)
+        space.secret_size = codes.shape[1]
+        space.codes = codes
+        space.color_sets = color_sets
+        space._table = feedback_table
+        space._table_points = None if feedback_table is None else tuple(points)
+        return space
+
+    def __len__(self):
+        return len(self.codes)
+
+    def scores(self, guess, candidates, correct_color_points, correct_position_points):
+        """Scores a guess as MastermindMatch.rate_guess would if the secret
+        were each of the given candidates
+
+        Args:
+            guess (int): index of the guess in the space
+            candidates (numpy.ndarray): indices of the candidate secrets
+            correct_color_points, correct_position_points: point schedule
+            of the match
+
+        Returns:
+            numpy.ndarray: one score per candidate
+        """
+        pegs = self.codes[guess]
+        correct_position = self.codes[candidates] == pegs
+        in_secret = (self.color_sets[candidates, None] >> pegs) & 1
+        correct_colors = in_secret.astype(bool) & ~correct_position
+        return correct_colors.sum(axis=1)*correct_color_points + \
+            correct_position.sum(axis=1)*correct_position_points
+
+    def feedback_table(self, correct_color_points, correct_position_points):
+        """Scores of every guess against every candidate secret, computed
+        once and kept (table[guess, secret])"""
+        points = (correct_color_points, correct_position_points)
+        if self._table is None or self._table_points != points:
+            everyone = np.arange(len(self))
+            self._table = np.stack([self.scores(guess, everyone, *points)
+                                    for guess in everyone])
+            self._table_points = points
+        return self._table
+
+
+@lru_cache(maxsize=8)
+def candidate_space(secret_size):
+    """The (cached) CandidateSpace of a secret size"""
+    return CandidateSpace(secret_size)
+
+
+class ConsistentSetSolver:
+    """Plays Mastermind matches by pruning the candidate space"""
+
+    CRITERIA = ('minimax', 'entropy')
+
+    def __init__(self, secret_size, criterion='minimax', table_size_limit=1296,
+                 work_limit=2_000_000, rng=None, space=None):
+        """Initializes a solver for secrets of a given size
+
+        Args:
+            secret_size (int): number of pegs of the secrets
+            criterion (str, optional): 'minimax' (smallest largest group of
+                remaining candidates) or 'entropy' (most informative score).
+                Defaults to 'minimax'.
+            table_size_limit (int, optional): largest candidate space for
+                which the scores of every guess against every candidate are
+                precomputed (the table holds size^2 scores). Defaults to 1296.
+            work_limit (int, optional): maximum number of (guess, candidate)
+                scores compared to choose one guess, which bounds the time
+                spent per guess. Defaults to 2 000 000.
+            rng (optional): RandomStream or integer seed drawing the guesses
+                examined when work_limit is reached (see
+                ga_solver.random_stream).
+            space (CandidateSpace, optional): candidate space of secret_size
+                to use. Defaults to None (the cached candidate_space).
+        """
+        if criterion not in self.CRITERIA:
+            raise ValueError(f"Unknown criterion: {criterion}")
+        self.space = candidate_space(secret_size) if space is None else space
+        self.criterion = criterion
+        self.table_size_limit = table_size_limit
+        self.work_limit = work_limit
+        self.rng = random_stream(rng)
+
+    def _partition_sizes(self, scores):
+        """Sizes of the groups of candidates sharing each score"""
+        return np.unique(scores, return_counts=True)[1]
+
+    def _quality(self, scores):
+        """Quality of a guess given its scores against the consistent
+        candidates (higher is better)"""
+        sizes = self._partition_sizes(scores)
+        if self.criterion == 'minimax':
+            return -sizes.max()
+        p = sizes / sizes.sum()
+        return -(p * np.log2(p)).sum()
+
+    def choose_guess(self, consistent, points):
+        """Picks the next guess among the consistent candidates
+
+        Args:
+            consistent (numpy.ndarray): indices of the consistent candidates
+            points (tuple): point schedule of the match
+
+        Returns:
+            int: index of the guess in the space
+        """
+        if len(consistent) <= 2:
+            return int(consistent[0])
+        nb_guesses = max(1, min(len(consistent), self.work_limit // len(consistent)))
+        if nb_guesses < len(consistent):
+            pool = self.rng.generator.choice(consistent, nb_guesses, replace=False)
+        else:
+            pool = consistent
+        use_table = len(self.space) <= self.table_size_limit
+        if use_table:
+            table = self.space.feedback_table(*points)
+        best_guess, best_quality = None, None
+        for guess in pool:
+            if use_table:
+                scores = table[guess, consistent]
+            else:
+                scores = self.space.scores(guess, consistent, *points)
+            quality = self._quality(scores)
+            if best_quality is None or quality > best_quality:
+                best_guess, best_quality = int(guess), quality
+        return best_guess
+
+    def guess_counts(self, points=(1, 3)):
+        """Number of guesses play needs for each possible secret
+
+        Follows the decision tree of play over the whole candidate space at
+        once (one choose_guess per node, scores taken from the feedback table
+        when there is one), so max() of the result is the guaranteed bound of
+        the solver. The tree is exact as long as work_limit is not reached;
+        beyond it, the examined guesses are drawn from rng.
+
+        Args:
+            points (tuple, optional): point schedule of the matches.
+                Defaults to (1, 3), the one of MastermindProblem.
+
+        Returns:
+            numpy.ndarray: guesses needed for each candidate (by index in
+            the space)
+        """
+        counts = np.zeros(len(self.space), dtype=int)
+        use_table = len(self.space) <= self.table_size_limit
+        nodes = [(np.arange(len(self.space)), 1)]
+        while nodes:
+            consistent, depth = nodes.pop()
+            guess = self.choose_guess(consistent, points)
+            counts[guess] = depth
+            if use_table:
+                scores = self.space.feedback_table(*points)[guess, consistent]
+            else:
+                scores = self.space.scores(guess, consistent, *points)
+            others = consistent != guess
+            for score in np.unique(scores[others]):
+                nodes.append((consistent[others & (scores == score)], depth + 1))
+        return counts
+
+    def play(self, match, max_guesses=None):
+        """Solves a match
+
+        Args:
+            match (MastermindMatch): the match to solve (its secret size must
+                be the solver's)
+            max_guesses (int, optional): stop after this many guesses.
+                Defaults to None (until the secret is found).
+
+        Returns:
+            list[tuple]: the guesses played (as color strings) with their
+            scores; the last one is the secret unless max_guesses was reached
+        """
+        points = (match.correct_color_points, match.correct_position_points)
+        consistent = np.arange(len(self.space))
+        history = []
+        while max_guesses is None or len(history) < max_guesses:
+            guess = self.choose_guess(consistent, points)
+            pegs = mm.decode_guess(self.space.codes[guess].tolist())
+            score = match.rate_guess(pegs)
+            history.append((pegs, score))
+            if match.is_correct(pegs):
+                break
+            # keep the candidates that would have given the same score
+            keep = self.space.scores(guess, consistent, *points) == score
+            keep &= consistent != guess
+            consistent = consistent[keep]
+        return history
+
+
+def solve(problem, max_space_size=6**6, **solver_options):
+    """Solves a MastermindProblem exhaustively when its candidate space is
+    small enough, with the genetic algorithm otherwise
+
+    Args:
+        problem (MastermindProblem): the problem to solve
+        max_space_size (int, optional): largest candidate space solved
+            exhaustively. Defaults to 6^6.
+        solver_options: arguments of ConsistentSetSolver or of GASolver,
+            depending on the chosen method
+
+    Returns:
+        tuple: the best guess found (color strings) and the method used
+        ('exhaustive' or 'genetic')
+    """
+    nb_colors = len(mm.get_possible_colors())
+    if nb_colors ** problem.secret_size <= max_space_size:
+        solver = ConsistentSetSolver(problem.secret_size, **solver_options)
+        return solver.play(problem.match)[-1][0], 'exhaustive'
+
+    with GASolver(problem, **solver_options) as solver:
+        solver.reset_population()
+        solver.evolve_until(threshold_fitness=problem.target_fitness)
+        return solver.get_best_individual().chromosome, 'genetic'
+
+
+if __name__ == '__main__':
+    from mastermind_problem import MastermindProblem
+
+    problem = MastermindProblem(secret_size=4)
+    history = ConsistentSetSolver(problem.secret_size).play(problem.match)
+    for guess, score in history:
+        print(guess, score)
+    print(f"Problem solved in {len(history)} guesses? "
+          f"{problem.match.is_correct(history[-1][0])}")
@@ -7,91 +7,344 @@ Created on Thu Feb 18 2022
 Template file for your Exercise 3 submission 
 (GA solving TSP example)
 """
-from ga_solver import GAProblem, Individual
+from ga_solver import GAProblem, Individual, random_stream
 import cities
-import random
+import local_search
+import numpy as np
 
 class TSProblem(GAProblem):
     """Implémentation of GAProblem (TSP)"""
     
-    def __init__(self, city_dict, num_cities=12, target_fitness=None, max_generations=1000):
+    # Operators that can be given to TSProblem(crossover_operator=...,
+    # mutation_operators=...)
+    CROSSOVER_OPERATORS = ('ox', 'pmx', 'edge')
+    MUTATION_OPERATORS = ('swap', 'two_opt', 'or_opt')
+
+    def __init__(self, city_dict, num_cities=12, target_fitness=None, max_generations=1000,
+                 mutation_operators=MUTATION_OPERATORS, crossover_operator='ox',
+                 nb_neighbours=8, greedy_fraction=0.0, dense_distance_limit=5000,
+                 distances=None, rng=None):
         """Initializes the TSP problem
 
+            The distances between the visited cities are computed once here;
+            chromosomes are permutations of city indices (see decode to get
+            the city names back).
+
             Args:
-            city_dict (dict): Dictionary of cities with their coordinates
-            num_cities (int): Number of cities to visit
+            city_dict (dict): Dictionary of cities with their coordinates, or
+                cities.CityTable (see cities.load_city_arrays)
+            num_cities (int): Number of cities to visit (the first ones of
+                city_dict; None to visit all of them)
             target_fitness (float, optional): Target fitness to stop the algorithm
             max_generations (int): Maximum number of generations
+            mutation_operators (tuple[str]): Operators among which mutate
+                picks one at random ('swap', 'two_opt' and/or 'or_opt')
+            crossover_operator (str): 'ox' (order crossover), 'pmx'
+                (partially mapped crossover) or 'edge' (edge recombination)
+            nb_neighbours (int): Size of the nearest neighbour lists of the
+                local search (see improve)
+            greedy_fraction (float): Fraction of the individuals created as
+                nearest neighbour roads from a random city instead of random
+                permutations
+            dense_distance_limit (int): Above this number of cities, the
+                distances are computed from the coordinates when needed
+                instead of being stored in a matrix
+            distances (numpy.ndarray, optional): Precomputed distance matrix
+                of the first cities of city_dict (at least num_cities), e.g.
+                shared by several problems over the same cities (see
+                batch_solver); its top-left block is used without copy
+            rng: RandomStream or integer seed of the random draws (see
+                ga_solver.random_stream)
         """
         self.city_dict = city_dict
+        if num_cities is None or num_cities > len(city_dict):
+            num_cities = len(city_dict)
         self.num_cities = num_cities
-        self.possible_cities = cities.default_road(city_dict)
+        if isinstance(city_dict, cities.CityTable):
+            self.possible_cities = city_dict.names[:num_cities].tolist()
+            self.coordinates = np.array(city_dict.coordinates[:num_cities], dtype=float)
+        else:
+            self.possible_cities = cities.default_road(city_dict)[:num_cities]
+            self.coordinates = np.array([city_dict[c] for c in self.possible_cities],
+                                        dtype=float).reshape(-1, 2)
+        if distances is not None:
+            self.distances = distances[:num_cities, :num_cities]
+        elif num_cities <= dense_distance_limit:
+            self.distances = cities.distance_matrix(self.coordinates)
+        else:
+            self.distances = cities.CoordinateDistances(self.coordinates)
         self.target_fitness = target_fitness
         self.max_generations = max_generations
+        for operator in mutation_operators:
+            if operator not in self.MUTATION_OPERATORS:
+                raise ValueError(f"Unknown mutation operator: {operator}")
+        self.mutation_operators = tuple(mutation_operators)
+        if crossover_operator not in self.CROSSOVER_OPERATORS:
+            raise ValueError(f"Unknown crossover operator: {crossover_operator}")
+        self.crossover_operator = crossover_operator
+        self.nb_neighbours = nb_neighbours
+        self.greedy_fraction = greedy_fraction
+        self.rng = random_stream(rng)
+        # built when first needed
+        self._spatial_index = None
+        self._local_search = None
+
+    @property
+    def spatial_index(self):
+        """Spatial index over the visited cities (see cities.SpatialIndex)"""
+        if self._spatial_index is None:
+            self._spatial_index = cities.SpatialIndex(self.coordinates)
+        return self._spatial_index
+
+    def road_length(self, chromosome):
+        """Length of the road described by a chromosome of city indices"""
+        return cities.indexed_road_length(self.distances, chromosome)
+
+    def decode(self, chromosome):
+        """Converts a chromosome of city indices into the list of city names"""
+        return [self.possible_cities[i] for i in chromosome]
     
     def create_individual(self):
         """Creation of an  individu with random road """
-        # Génération d'un chemin aléatoire (permutation de villes)
-        chromosome = random.sample(self.possible_cities, self.num_cities)
+        if self.greedy_fraction > 0 and self.rng.random() < self.greedy_fraction:
+            # nearest neighbour road from a random city
+            chromosome = self.spatial_index.greedy_road(self.rng.randrange(self.num_cities))
+        else:
+            # Génération d'un chemin aléatoire (permutation de villes)
+            chromosome = self.rng.sample(range(self.num_cities), self.num_cities)
         
         # Calcul de la fitness (négatif de la longueur du chemin)
-        fitness = -cities.road_length(self.city_dict, chromosome)
+        fitness = None if self.defer_evaluation else -self.road_length(chromosome)
         
         return Individual(chromosome, fitness)
     
     def select_parents(self, population):
         """Select two  parents for the reproduction"""
-        return random.sample(population, 2)
+        return self.rng.sample(population, 2)
     
     def crossover(self, parents):
         """Crossing of two parents to create a child
-        
-        Uses order-preserving crossover to maintain a valid path
+
+        Uses the permutation crossover chosen by crossover_operator, so the
+        child always visits every city once. All of them run in O(n).
         """
         parent_a, parent_b = parents[0].chromosome, parents[1].chromosome
         
-        # Croissing of ordered road 
-        cutpoint = len(parent_a) // 2
-        child_chrom = parent_a[:cutpoint]
-        
-        # Add  parent_b' s cities that are not yet in  child
-        for city in parent_b:
-            if city not in child_chrom:
-                child_chrom.append(city)
-        
-        # Vérify if all the cities are present 
-        if len(child_chrom) < self.num_cities:
-            for city in self.possible_cities:
-                if city not in child_chrom:
-                    child_chrom.append(city)
-                    if len(child_chrom) == self.num_cities:
-                        break
+        if self.crossover_operator == 'ox':
+            child_chrom = self._order_crossover(parent_a, parent_b)
+        elif self.crossover_operator == 'pmx':
+            child_chrom = self._partially_mapped_crossover(parent_a, parent_b)
+        else:
+            child_chrom = self._edge_recombination(parent_a, parent_b)
         
         # Calculation of  fitness
-        fitness = -cities.road_length(self.city_dict, child_chrom)
+        fitness = None if self.defer_evaluation else -self.road_length(child_chrom)
         
         return Individual(child_chrom, fitness)
+
+    def _cut_points(self):
+        """Two random cut points i < j delimiting a non empty section [i, j)"""
+        i, j = sorted(self.rng.sample(range(self.num_cities + 1), 2))
+        return i, j
+
+    def _order_crossover(self, parent_a, parent_b):
+        """OX: keeps a random section of parent_a in place, the other cities
+        follow their order in parent_b starting after the section"""
+        n = self.num_cities
+        i, j = self._cut_points()
+        section = parent_a[i:j]
+        taken = bytearray(n)
+        for city in section:
+            taken[city] = 1
+        others = [city for city in parent_b[j:] + parent_b[:j] if not taken[city]]
+        # others fills the positions after the section, then wraps around
+        return others[n - j:] + section + others[:n - j]
+
+    def _partially_mapped_crossover(self, parent_a, parent_b):
+        """PMX: keeps a random section of parent_a in place, the other
+        positions come from parent_b, following the mapping defined by the
+        section when parent_b's city is already used"""
+        n = self.num_cities
+        i, j = self._cut_points()
+        in_section = bytearray(n)
+        position_in_a = {}
+        for k in range(i, j):
+            in_section[parent_a[k]] = 1
+            position_in_a[parent_a[k]] = k
+        
+        child_chrom = parent_b.copy()
+        child_chrom[i:j] = parent_a[i:j]
+        for k in list(range(i)) + list(range(j, n)):
+            city = parent_b[k]
+            while in_section[city]:
+                city = parent_b[position_in_a[city]]
+            child_chrom[k] = city
+        return child_chrom
+
+    def _edge_recombination(self, parent_a, parent_b):
+        """Edge recombination: builds a road from the edges of both parents,
+        going each time to the neighbour having the fewest neighbours left"""
+        n = self.num_cities
+        neighbours = [set() for _ in range(n)]
+        for parent in (parent_a, parent_b):
+            for k, city in enumerate(parent):
+                neighbours[city].add(parent[k - 1])
+                neighbours[city].add(parent[(k + 1) % n])
+        
+        # unvisited cities, with their positions for O(1) removal
+        unvisited = list(range(n))
+        position = list(range(n))
+        
+        child_chrom = []
+        city = parent_a[0]
+        while True:
+            child_chrom.append(city)
+            last = unvisited.pop()
+            if last != city:
+                unvisited[position[city]] = last
+                position[last] = position[city]
+            for neighbour in neighbours[city]:
+                neighbours[neighbour].discard(city)
+            if not unvisited:
+                return child_chrom
+            candidates = neighbours[city]
+            if candidates:
+                city = min(candidates, key=lambda c: (len(neighbours[c]), self.rng.random()))
+            else:
+                city = unvisited[self.rng.randrange(len(unvisited))]
     
     def mutate(self, individual, mutation_rate):
-        """Applies a mutation by swapping two cities with a certain probability"""
-        if random.random() >= mutation_rate:
+        """Applies a mutation with a certain probability
+
+        One of the mutation operators is picked at random. The fitness of the
+        mutated individual is computed from the parent's fitness and the few
+        edges that changed, so it costs O(1) whatever the road length.
+        """
+        if self.rng.random() >= mutation_rate:
             return individual  # no mutation
         
-        # Copie du chromosome
-        mutated_chrom = individual.chromosome.copy()
+        operator = self.rng.choice(self.mutation_operators)
+        if operator == 'swap':
+            mutated_chrom, delta = self._swap(individual.chromosome)
+        elif operator == 'two_opt':
+            mutated_chrom, delta = self._two_opt(individual.chromosome)
+        else:
+            mutated_chrom, delta = self._or_opt(individual.chromosome)
         
+        # the fitness is the negative road length (still unknown if the
+        # parent is waiting for a batch evaluation)
+        fitness = None if individual.fitness is None else individual.fitness - delta
+        
+        return Individual(mutated_chrom, fitness)
+
+    def _edges_length(self, road, edges):
+        """Total length of the given edges of a road (edge k goes from
+        road[k] to road[k+1], the last one closes the loop)"""
+        d = self.distances
+        n = len(road)
+        return sum(d[road[k], road[(k + 1) % n]] for k in edges)
+
+    def _swap(self, chromosome):
+        """Exchanges two random cities
+
+        Returns:
+            tuple: the new chromosome and the variation of the road length
+        """
+        n = self.num_cities
         # Selection of two random positions 
-        pos1 = random.randint(0, self.num_cities - 1)
-        pos2 = random.randint(0, self.num_cities - 1)
+        pos1 = self.rng.randint(0, n - 1)
+        pos2 = self.rng.randint(0, n - 1)
+        
+        # only the edges around the two positions change (a set, since they
+        # overlap when the positions are neighbours)
+        edges = {(pos1 - 1) % n, pos1, (pos2 - 1) % n, pos2}
+        before = self._edges_length(chromosome, edges)
         
-        # exchange of the two cities 
+        mutated_chrom = chromosome.copy()
         mutated_chrom[pos1], mutated_chrom[pos2] = mutated_chrom[pos2], mutated_chrom[pos1]
         
-        # Calculate the new fitness
-        fitness = -cities.road_length(self.city_dict, mutated_chrom)
+        return mutated_chrom, float(self._edges_length(mutated_chrom, edges) - before)
+
+    def _two_opt(self, chromosome):
+        """Reverses a random section of the road (2-opt move)
+
+        Returns:
+            tuple: the new chromosome and the variation of the road length
+        """
+        n = self.num_cities
+        if n < 4:
+            return chromosome.copy(), 0.0
+        i, j = sorted(self.rng.sample(range(n), 2))
+        if i == 0 and j == n - 1:
+            # reversing the whole road gives the same loop
+            return chromosome[::-1], 0.0
         
-        return Individual(mutated_chrom, fitness)
+        d = self.distances
+        a, b = chromosome[i - 1], chromosome[i]
+        c, e = chromosome[j], chromosome[(j + 1) % n]
+        # the edges a-b and c-e are replaced by a-c and b-e
+        delta = d[a, c] + d[b, e] - d[a, b] - d[c, e]
+        
+        mutated_chrom = chromosome[:i] + chromosome[i:j + 1][::-1] + chromosome[j + 1:]
+        return mutated_chrom, float(delta)
+
+    def _or_opt(self, chromosome):
+        """Moves a random section of 1 to 3 cities elsewhere in the road
+        (or-opt move), possibly reversed
+
+        Returns:
+            tuple: the new chromosome and the variation of the road length
+        """
+        n = self.num_cities
+        seg_len = self.rng.randint(1, min(3, n - 2)) if n >= 3 else 0
+        if seg_len == 0:
+            return chromosome.copy(), 0.0
+        
+        d = self.distances
+        start = self.rng.randint(0, n - seg_len)
+        segment = chromosome[start:start + seg_len]
+        rest = chromosome[:start] + chromosome[start + seg_len:]
+        
+        # remove the section: prev-first and last-next become prev-next
+        prev, nxt = chromosome[start - 1], chromosome[(start + seg_len) % n]
+        delta = d[prev, nxt] - d[prev, segment[0]] - d[segment[-1], nxt]
+        
+        # insert it between two consecutive cities u-v of the remaining road
+        k = self.rng.randint(0, len(rest) - 1)
+        u, v = rest[k], rest[(k + 1) % len(rest)]
+        if self.rng.random() < 0.5:
+            segment.reverse()
+        delta += d[u, segment[0]] + d[segment[-1], v] - d[u, v]
+        
+        mutated_chrom = rest[:k + 1] + segment + rest[k + 1:]
+        return mutated_chrom, float(delta)
     
+    def improve(self, individual, max_moves=None, deadline=None):
+        """Improves a road with 2-opt and Or-opt moves (see local_search)"""
+        if self._local_search is None:
+            neighbours = self.spatial_index.nearest_neighbours(self.nb_neighbours)
+            self._local_search = local_search.LocalSearch(self.distances, neighbours)
+        road, delta = self._local_search.improve(individual.chromosome, max_moves, deadline)
+        if delta == 0:
+            return individual
+        fitness = None if individual.fitness is None else individual.fitness - delta
+        return Individual(road, fitness)
+
+    def canonical_chromosome(self, chromosome):
+        """Same tuple for all the chromosomes describing the same loop:
+        starts from city 0, in the direction of its smallest neighbour"""
+        start = chromosome.index(0)
+        road = chromosome[start:] + chromosome[:start]
+        if len(road) > 2 and road[-1] < road[1]:
+            road[1:] = road[:0:-1]
+        return tuple(road)
+
+    def evaluate_batch(self, chromosomes):
+        """Rates a 2D array of roads at once (one road per row)"""
+        chromosomes = np.asarray(chromosomes)
+        next_cities = np.roll(chromosomes, -1, axis=1)
+        return -self.distances[chromosomes, next_cities].sum(axis=1)
+
     def is_solution_found(self, best_individual, generation):
         """Détermine si une solution satisfaisante a été trouvée"""
         # if the target fitness  is spécified, vérify if she is reached
@@ -110,4 +363,4 @@ if __name__ == '__main__':
     solver = GASolver(problem)
     solver.reset_population()
     solver.evolve_until()
-    cities.draw_cities(city_dict, solver.get_best_individual().chromosome)
+    cities.draw_cities(city_dict, problem.decode(solver.get_best_individual().chromosome))